@@ -6,32 +6,266 @@ Manages Chrome/Selenium sessions as a "sandbox" for WhatsApp Web.
 Uses Gemini AI to process and personalize user's base message.
 """
 
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-import pandas as pd
+from selenium.common.exceptions import (
+    TimeoutException, StaleElementReferenceException, NoSuchElementException
+)
 import time
 import urllib.parse
 import json
 import os
+import random
 import asyncio
-from datetime import datetime
-from typing import Callable, Optional, List, Dict, Any
+import inspect
+import hashlib
+import logging
+import logging.handlers
+import queue
+import atexit
+import concurrent.futures
+import importlib.util
+from collections import OrderedDict
+from typing import Callable, Optional, List, Dict, Any, Iterable, Tuple
 
-# Gemini for AI message processing
+# pandas, openpyxl, Gemini and selenium's Chrome driver classes are imported
+# where they are first used. The selenium helpers above are not lightweight:
+# importing any selenium.webdriver submodule loads the whole webdriver package,
+# but the module-level locators and lookup errors need them.
+
+# Gemini for AI message processing (imported lazily in __init__)
+try:
+    GEMINI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ImportError:
+    GEMINI_AVAILABLE = False  # The "google" namespace package itself is missing
+
+# orjson for faster JSON encoding/decoding; stdlib json as fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# python-calamine (Rust) reads .xlsx and legacy .xls much faster than openpyxl
 try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
 except ImportError:
-    GEMINI_AVAILABLE = False
+    CALAMINE_AVAILABLE = False
 
 # Gemini API Key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# AI variant pool size, and how many variations a single Gemini request returns.
+# Lower the per-request count on low TPM tiers (each variant costs roughly one
+# message of output tokens); larger pools are split into concurrent requests.
+AI_VARIANT_COUNT = int(os.getenv("AI_VARIANT_COUNT", "20"))
+AI_VARIANTS_PER_REQUEST = max(1, int(os.getenv("AI_VARIANTS_PER_REQUEST", "20")))
+AI_MAX_RETRIES = 4  # Retries on 429 with exponential backoff (1s, 2s, 4s)
+
+# JSON mode with a list-of-strings schema makes Gemini return the variants as a bare JSON array
+AI_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": list[str]}
+AI_MODEL_NAME = "gemini-2.5-flash"
+
+# Fixed instructions sent as the system instruction; per-request prompts carry only
+# the base message, count and sample names.
+AI_SYSTEM_INSTRUCTION = """You are a campaign message assistant. You take a base election campaign message and create slightly varied versions of it.
+
+INSTRUCTIONS:
+1. Keep the EXACT same meaning and intent
+2. Keep it in the SAME language (Telugu/Hindi/English - whatever the original is)
+3. Make SMALL variations like:
+   - Slightly different greeting
+   - Minor word order changes
+   - Add or remove an emoji
+4. Keep it SHORT and RESPECTFUL
+5. Do NOT add any new content or promises
+6. Where a greeting addresses the voter, write the placeholder {NAME} instead of a real name
+7. Return ONLY a JSON array with the requested number of strings, no explanations"""
+
+# Concurrent Gemini requests allowed, derived from the per-minute quota
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "60"))
+AI_MAX_CONCURRENT_REQUESTS = max(1, GEMINI_RPM_LIMIT // 60)
+
+# On-disk cache of AI variants, keyed by base message hash, reused across campaigns
+VARIANT_CACHE_DIR = os.getenv(
+    "VARIANT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".voteflow_whatsapp", "variants")
+)
+VARIANT_CACHE_TTL = 7 * 24 * 3600  # seconds (1 week)
+
+# In-process LRU in front of the disk cache: key -> (created_at, variants)
+VARIANT_MEMORY_CACHE_SIZE = 32
+_variant_memory_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Placeholder the AI (or the user) can put in a message for the voter's name
+NAME_PLACEHOLDER = "{NAME}"
+
+# WhatsApp Web element locators (built once, reused for every message)
+SEND_BUTTON = (By.XPATH, '//span[@data-icon="send"]')
+SEARCH_BOX = (By.XPATH, '//div[@contenteditable="true"][@data-tab="3"]')
+MESSAGE_BOX = (By.XPATH, '//footer//div[@contenteditable="true"][@data-tab="10"]')
+# Chat titles in the search results, and the title of the open chat's header
+SEARCH_RESULT_TITLES = (By.XPATH, '//div[@id="pane-side"]//span[@title]')
+CHAT_HEADER_TITLE = (By.XPATH, '//div[@id="main"]//header//span[@title]')
+# Outgoing messages in the open chat, counted before each send so the tick
+# check only looks at messages added after it (not the previous voter's tick)
+MESSAGE_OUT_COUNT_JS = "return document.querySelectorAll('#main div[class*=\"message-out\"]').length;"
+SENT_TICK_AFTER = (
+    '(//div[@id="main"]//div[contains(@class,"message-out")])[position() > {}]'
+    '//span[@data-icon="msg-check" or @data-icon="msg-dblcheck"]'
+)
+
+# QR capture: a MutationObserver records each new QR data-ref, and we only
+# screenshot when one appears (instead of on a fixed timer)
+QR_POLL_INTERVAL = 1  # seconds between checks for a new QR / logged-in panel
+QR_WAIT_TIMEOUT = int(os.getenv("WHATSAPP_QR_TIMEOUT", "60"))  # seconds
+QR_OBSERVER_JS = """
+if (!window._qr_observer) {
+    window._qr_changes = [];
+    var lastRef = null;
+    var check = function () {
+        var canvas = document.querySelector("canvas[aria-label*='Scan']");
+        if (!canvas) return;
+        var holder = canvas.closest('[data-ref]');
+        var ref = holder ? holder.getAttribute('data-ref') : null;
+        if (ref && ref !== lastRef) {
+            lastRef = ref;
+            window._qr_changes.push(ref);
+        }
+    };
+    window._qr_observer = new MutationObserver(check);
+    window._qr_observer.observe(document.body, {
+        subtree: true, childList: true, attributes: true, attributeFilter: ['data-ref']
+    });
+    check();
+}
+"""
+# One round trip per poll: next QR change (or null) and whether the chat list is up
+QR_POLL_JS = "return [(window._qr_changes || []).shift() || null, !!document.getElementById('side')];"
+
+# Resident send: open chats from the already-loaded app via the search box
+# instead of a full page load per message (falls back to the /send URL)
+RESIDENT_SEND = os.getenv("CAMPAIGN_RESIDENT_SEND", "true").lower() == "true"
+RESIDENT_CHAT_WAIT = 4  # seconds to wait for a searched chat to open
+# Lookup failures that mean "open this chat by URL instead", not a failed send
+RESIDENT_LOOKUP_ERRORS = (TimeoutException, StaleElementReferenceException, NoSuchElementException)
+RESIDENT_MISS_LIMIT = 5  # Consecutive misses before giving up on search for the campaign
+
+SEND_QUEUE_SIZE = 4  # Messages prepared ahead of the send worker
+# Target seconds between the starts of consecutive sends (spam-detection spacing)
+SEND_INTERVAL_MIN = 3
+SEND_INTERVAL_MAX = 5
+
+# Voter loading: rows are normalized in chunks as they stream from the sheet
+NORMALIZE_CHUNK_SIZE = 50_000
+SKIP_MOBILES = {"", "N/A", "UNCLEAR", "nan", "None"}
+
+# WebSocket event batching - events are coalesced into one frame per interval
+WS_FLUSH_INTERVAL = 0.2  # seconds (5 frames/sec at most)
+WS_MAX_BATCH = 64  # events per frame
+
+# Campaign log output is handed to a background thread (QueueListener) so the
+# send loop never blocks on stdio writes/flushes
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%H:%M:%S"))
+    _log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Uppercase tags for console output, keyed by log type
+LOG_TAGS = {t: f"[{t.upper()}]" for t in ("info", "system", "success", "warning", "error")}
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes (orjson when available)."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(data, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when available)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(data, ensure_ascii=False, indent=2 if indent else None).encode()
+
+
+# Chrome drivers kept alive across campaigns (keyed by user), so later campaigns
+# skip Chrome start-up and the WhatsApp session restore. The per-user lock keeps
+# two campaigns from driving the same browser at once.
+_DRIVER_POOL: Dict[str, Any] = {}
+_DRIVER_POOL_LOCKS: Dict[str, asyncio.Lock] = {}
+
+
+def _title_digits(element) -> str:
+    """Digits of a WhatsApp chat title ("+91 98765 43210" -> "919876543210")."""
+    return "".join(ch for ch in (element.get_attribute("title") or "") if ch.isdigit())
+
+
+def _driver_pool_key(user_id: Optional[str]) -> str:
+    return user_id or "default"
+
+
+def _driver_pool_lock(key: str) -> asyncio.Lock:
+    """Per-user pool lock (created lazily so it binds to the running event loop)."""
+    lock = _DRIVER_POOL_LOCKS.get(key)
+    if lock is None:
+        lock = _DRIVER_POOL_LOCKS[key] = asyncio.Lock()
+    return lock
+
+
+def _quit_pooled_drivers():
+    """Quit pooled headless drivers on exit (GUI ones are detached and stay open)."""
+    if os.getenv("CHROME_HEADLESS", "false").lower() != "true":
+        return
+    for driver in list(_DRIVER_POOL.values()):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+    _DRIVER_POOL.clear()
+
+
+atexit.register(_quit_pooled_drivers)
+
+
+class WhatsAppQRProvider:
+    """
+    Latest WhatsApp QR screenshot per user, kept in memory for /api/whatsapp/qr.
+    Each PNG carries an ETag so polling clients can get 304 Not Modified.
+    """
+    
+    def __init__(self):
+        # Insertion order doubles as recency: the last entry is the newest QR
+        self._codes: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+    
+    def update(self, user_id: Optional[str], png: bytes):
+        key = _driver_pool_key(user_id)
+        self._codes.pop(key, None)
+        self._codes[key] = (png, f'"{hashlib.md5(png).hexdigest()}"')
+    
+    def get(self, user_id: Optional[str] = None) -> Optional[Tuple[bytes, str]]:
+        """(png, etag) for the user, or the most recent QR when no user is given."""
+        if user_id:
+            return self._codes.get(_driver_pool_key(user_id))
+        return next(reversed(self._codes.values()), None)
+    
+    def clear(self, user_id: Optional[str]):
+        self._codes.pop(_driver_pool_key(user_id), None)
+
+
+qr_provider = WhatsAppQRProvider()
+
+
 class CampaignRunner:
     """
     Manages WhatsApp campaign execution with real-time status updates.
@@ -46,7 +280,7 @@ class CampaignRunner:
         message_template: Optional[str] = None,
         broadcast_callback: Optional[Callable] = None,
         use_ai: bool = True,
-        quota_remaining: int = 0  # Message quota limit
+        quota_remaining: Optional[int] = None  # Messages reserved for this campaign (None = no cap)
     ):
         self.campaign_id = campaign_id
         self.user_id = user_id
@@ -59,8 +293,34 @@ class CampaignRunner:
         self.use_ai = use_ai
         self.quota_remaining = quota_remaining
         self.messages_sent_this_session = 0
+        self._variant_pool: List[str] = []
+        self._variant_parts: List[List[str]] = []  # Each variant split around {NAME}
+        self._encoded_parts: List[List[str]] = []  # Same parts, percent-encoded
+        self._set_variant_pool([self.base_message])
+        
+        # Outgoing WebSocket events, drained by _flush_loop into batched frames.
+        # Created in execute_campaign so they bind to the running event loop.
+        self._ws_queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        
+        # Single thread that runs every blocking WebDriver call off the event loop
+        # (WebDriver isn't thread-safe, so all calls share this one thread)
+        self._driver_exec: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        
+        # Set when a pooled driver with a logged-in WhatsApp session was reused
+        self._session_warm = False
+        # Set while running, cleared while paused
+        self._resume_event: Optional[asyncio.Event] = None
+        
+        # Resident (search box) sends; switched off after RESIDENT_MISS_LIMIT misses in a row
+        self._resident_send = RESIDENT_SEND
+        self._resident_misses = 0
         
-        # Statistics
+        # Statistics (only the latest snapshot per flush tick is sent; _total_inv
+        # is 100/total, so progress needs no divide per update)
+        self._pending_stats: Optional[Dict[str, Any]] = None
+        self._last_stats_key: Optional[tuple] = None
+        self._total_inv = 100.0
         self.stats = {
             "total": 0,
             "sent": 0,
@@ -73,8 +333,9 @@ class CampaignRunner:
         self.gemini_model = None
         if GEMINI_AVAILABLE and self.use_ai:
             try:
+                import google.generativeai as genai
                 genai.configure(api_key=GEMINI_API_KEY)
-                self.gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+                self.gemini_model = genai.GenerativeModel(AI_MODEL_NAME, system_instruction=AI_SYSTEM_INSTRUCTION)
             except Exception as e:
                 print(f"[WARN] Gemini init failed: {e}")
     
@@ -86,73 +347,290 @@ class CampaignRunner:
 
 ధన్యవాదాలు 🙏"""
     
-    async def _process_message_with_ai(self, base_message: str, voter_name: str = None) -> str:
+    async def _process_message_batch(self, base_message: str, names: List[str], k: int = AI_VARIANT_COUNT) -> List[str]:
         """
-        Use Gemini AI to process and enhance the base message.
-        Creates variations to avoid spam detection while keeping the core message.
+        Use Gemini AI to create K variations of the base message.
+        Variations avoid spam detection while keeping the core message; the pool is
+        reused across the voter loop instead of calling Gemini once per voter.
+        Pools larger than AI_VARIANTS_PER_REQUEST are fetched with concurrent requests.
         """
+        self._set_variant_pool([base_message])
         if not self.gemini_model:
-            return base_message
+            return self._variant_pool
         
-        try:
-            prompt = f"""You are a campaign message assistant. Take this base election campaign message and create a slightly varied version.
+        cached = self._load_cached_variants(base_message, k)
+        if cached:
+            self._set_variant_pool(cached)
+            return self._variant_pool
+        
+        sample_names = ", ".join(n for n in names[:5] if n)
+        counts = [min(AI_VARIANTS_PER_REQUEST, k - start) for start in range(0, k, AI_VARIANTS_PER_REQUEST)]
+        semaphore = asyncio.Semaphore(AI_MAX_CONCURRENT_REQUESTS)
+        results = await asyncio.gather(*(
+            self._request_variants(self._variant_prompt(base_message, n, sample_names), base_message, semaphore)
+            for n in counts
+        ))
+        
+        variants = [v for batch in results for v in batch]
+        if variants:
+            self._save_cached_variants(base_message, variants[:k])
+            self._set_variant_pool(variants[:k])
+        return self._variant_pool
+    
+    def _variant_prompt(self, base_message: str, k: int, sample_names: str) -> str:
+        """Build the per-request prompt (the fixed instructions are the system instruction)."""
+        names_line = f"\n\nExample voter names: {sample_names}" if sample_names else ""
+        return f"""Create {k} slightly varied versions of this message.
 
 BASE MESSAGE:
-{base_message}
-
-INSTRUCTIONS:
-1. Keep the EXACT same meaning and intent
-2. Keep it in the SAME language (Telugu/Hindi/English - whatever the original is)
-3. Make SMALL variations like:
-   - Slightly different greeting
-   - Minor word order changes
-   - Add or remove an emoji
-4. Keep it SHORT and RESPECTFUL
-5. Do NOT add any new content or promises
-6. Return ONLY the message, no explanations
-
-{f"Voter Name: {voter_name}" if voter_name else ""}
+{base_message}{names_line}
 
-OUTPUT (just the message):"""
-
-            response = self.gemini_model.generate_content(prompt)
-            processed_message = response.text.strip()
-            
-            # Fallback to base if AI response is too different or empty
-            if not processed_message or len(processed_message) > len(base_message) * 2:
-                return base_message
-            
-            return processed_message
-            
-        except Exception as e:
-            await self._log(f"⚠️ AI processing failed, using base message: {str(e)[:30]}", "warning")
-            return base_message
+OUTPUT (JSON array of {k} strings only):"""
+    
+    async def _request_variants(self, prompt: str, base_message: str, semaphore: asyncio.Semaphore) -> List[str]:
+        """Run one async Gemini request for variants, retrying 429s with backoff."""
+        for attempt in range(AI_MAX_RETRIES):
+            try:
+                async with semaphore:
+                    response = await self.gemini_model.generate_content_async(
+                        prompt, generation_config=AI_GENERATION_CONFIG
+                    )
+                response_text = response.text.strip()
+                
+                # Remove markdown code blocks if present
+                if response_text.startswith("```"):
+                    response_text = response_text.split("```")[1]
+                    if response_text.startswith("json"):
+                        response_text = response_text[4:]
+                variants = json_loads(response_text.strip())
+                if not isinstance(variants, list):
+                    # e.g. {"variations": [...]} or a bare string - iterating those would
+                    # turn keys or single characters into "variants"
+                    await self._log("⚠️ AI reply wasn't a JSON array, using base message", "warning")
+                    return []
+                
+                # Drop empty variants and ones that drift too far from the base
+                return [
+                    v.strip() for v in variants
+                    if isinstance(v, str) and v.strip() and len(v) <= len(base_message) * 2
+                ]
+                
+            except Exception as e:
+                is_rate_limited = "429" in str(e) or type(e).__name__ == "ResourceExhausted"
+                if is_rate_limited and attempt < AI_MAX_RETRIES - 1:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                await self._log(f"⚠️ AI processing failed, using base message: {str(e)[:30]}", "warning")
+                return []
+        
+        return []
+    
+    def _variant_cache_key(self, base_message: str) -> str:
+        return hashlib.sha256(base_message.encode()).hexdigest()
+    
+    def _remember_variants(self, key: str, created_at: float, variants: List[str]):
+        """Store variants in the in-process LRU, evicting the oldest entry when full."""
+        _variant_memory_cache[key] = (created_at, variants)
+        _variant_memory_cache.move_to_end(key)
+        while len(_variant_memory_cache) > VARIANT_MEMORY_CACHE_SIZE:
+            _variant_memory_cache.popitem(last=False)
+    
+    def _load_cached_variants(self, base_message: str, k: int) -> Optional[List[str]]:
+        """Load previously generated variants for this message if fresh and large enough."""
+        key = self._variant_cache_key(base_message)
+        
+        entry = _variant_memory_cache.get(key)
+        if entry is None:
+            path = os.path.join(VARIANT_CACHE_DIR, f"{key}.json")
+            try:
+                created_at = os.path.getmtime(path)
+                with open(path, "rb") as f:
+                    variants = json_loads(f.read())
+            except (OSError, ValueError):
+                return None
+            if not isinstance(variants, list) or not all(isinstance(v, str) for v in variants):
+                return None  # Corrupt or foreign cache file
+            entry = (created_at, variants)
+            self._remember_variants(key, *entry)
+        else:
+            _variant_memory_cache.move_to_end(key)
+        
+        created_at, variants = entry
+        if time.time() - created_at > VARIANT_CACHE_TTL or len(variants) < k:
+            return None
+        return variants[:k]
+    
+    def _save_cached_variants(self, base_message: str, variants: List[str]):
+        """Cache variants in memory and on disk (atomic write: temp file, then rename)."""
+        key = self._variant_cache_key(base_message)
+        self._remember_variants(key, time.time(), variants)
+        path = os.path.join(VARIANT_CACHE_DIR, f"{key}.json")
+        try:
+            os.makedirs(VARIANT_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(json_dumps(variants))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] Could not cache AI variants: {e}")
+    
+    def _set_variant_pool(self, variants: List[str]):
+        """
+        Store the variant pool, specialized for per-voter rendering: each variant is
+        split around {NAME} and percent-encoded once, so a send only joins in the name.
+        """
+        if NAME_PLACEHOLDER in self.base_message:
+            # The operator asked for the name - keep only variants that still include it
+            variants = [v for v in variants if NAME_PLACEHOLDER in v] or [self.base_message]
+        self._variant_pool = variants
+        self._variant_parts = [v.split(NAME_PLACEHOLDER) for v in variants]
+        self._encoded_parts = [
+            [urllib.parse.quote(part, safe="") for part in parts]
+            for parts in self._variant_parts
+        ]
+    
+    def _render_variant(self, i: int, name: str) -> str:
+        """Pick the i-th variant from the pool with the voter's name filled in."""
+        parts = self._variant_parts[i % len(self._variant_parts)]
+        return parts[0] if len(parts) == 1 else name.join(parts)
+    
+    def _encoded_variant(self, i: int, name: str) -> str:
+        """Pick the i-th variant from the pool, URL-encoded with the voter's name filled in."""
+        parts = self._encoded_parts[i % len(self._encoded_parts)]
+        return parts[0] if len(parts) == 1 else urllib.parse.quote(name, safe="").join(parts)
+    
+    async def _emit(self, event: Dict[str, Any]):
+        """Queue an event for the next batched WebSocket frame."""
+        await self._ws_queue.put(event)
+    
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Pop up to WS_MAX_BATCH queued events, plus the pending stats snapshot."""
+        batch = []
+        try:
+            while len(batch) < WS_MAX_BATCH:
+                batch.append(self._ws_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            pass
+        if self._pending_stats is not None:
+            batch.append({"type": "stats", "stats": self._pending_stats})
+            self._pending_stats = None
+        return batch
+    
+    async def _flush_loop(self):
+        """Broadcast queued events as one batched frame per WS_FLUSH_INTERVAL tick."""
+        while True:
+            await asyncio.sleep(WS_FLUSH_INTERVAL)
+            batch = self._take_batch()
+            if batch:
+                await self._send_batch(batch)
+    
+    async def _send_batch(self, batch: List[Dict[str, Any]]):
+        """Broadcast a list of events as a single frame."""
+        result = self.broadcast({"type": "batch", "events": batch})
+        if inspect.isawaitable(result):
+            await result
+    
+    def _start_flusher(self):
+        """Start the background WebSocket flusher if it isn't running."""
+        if self._ws_queue is None:
+            self._ws_queue = asyncio.Queue()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def _stop_flusher(self):
+        """Stop the flusher and send any events still queued."""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        
+        while self._ws_queue is not None:
+            batch = self._take_batch()
+            if not batch:
+                break
+            await self._send_batch(batch)
     
     async def _log(self, message: str, log_type: str = "info"):
         """Send log message to connected clients."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = {
             "type": "log",
             "log_type": log_type,
-            "timestamp": timestamp,
-            "message": message,
-            "stats": self.stats
+            "ts": time.time(),  # Epoch seconds, formatted client-side
+            "message": message
         }
-        await self.broadcast(log_entry)
-        print(f"[{timestamp}] [{log_type.upper()}] {message}")
+        await self._emit(log_entry)
+        logger.info("%s %s", LOG_TAGS.get(log_type) or f"[{log_type.upper()}]", message)
+    
+    async def _progress(self, i: int, name: str, phone: str, status: str):
+        """Send one compact per-voter progress event (short keys, epoch timestamp)."""
+        await self._emit({"t": "p", "i": i, "n": name, "p": phone, "s": status, "ts": time.time()})
     
     async def _update_stats(self):
-        """Broadcast current statistics."""
-        self.stats["progress"] = (self.stats["sent"] + self.stats["failed"]) / max(self.stats["total"], 1) * 100
-        await self.broadcast({
-            "type": "stats",
-            "stats": self.stats
-        })
+        """Stage current statistics; the flusher sends the latest snapshot each tick."""
+        stats = self.stats
+        key = (stats["total"], stats["sent"], stats["failed"])
+        if key == self._last_stats_key:
+            return  # Nothing changed since the last staged snapshot
+        self._last_stats_key = key
+        stats["progress"] = round((stats["sent"] + stats["failed"]) * self._total_inv, 1)
+        self._pending_stats = dict(stats)
+    
+    async def _run_driver(self, fn: Callable, *args):
+        """Run a blocking WebDriver call on the driver thread without blocking the loop."""
+        if self._driver_exec is None:
+            self._driver_exec = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"driver-{self.campaign_id}"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._driver_exec, fn, *args)
+    
+    def _reuse_pooled_driver(self) -> bool:
+        """Adopt this user's pooled driver if it is still alive on WhatsApp Web."""
+        key = _driver_pool_key(self.user_id)
+        driver = _DRIVER_POOL.get(key)
+        if driver is None:
+            return False
+        try:
+            on_whatsapp = driver.current_url.startswith("https://web.whatsapp.com")
+        except Exception:
+            on_whatsapp = False  # Browser was closed or crashed
+        if not on_whatsapp:
+            _DRIVER_POOL.pop(key, None)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            return False
+        
+        self.driver = driver
+        # The chat list only renders once the session is logged in
+        self._session_warm = bool(driver.find_elements(By.ID, "side"))
+        print("[INFO] ♻️ Reusing existing Chrome session")
+        return True
     
     def _init_browser(self):
         """Initialize Chrome browser for WhatsApp Web (the sandbox)."""
+        if self._reuse_pooled_driver():
+            return self._prepare_driver()
+        
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        
         chrome_options = Options()
         
+        # Only text is sent, so skip images/media and background work to save RAM/CPU
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+        })
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--disable-background-networking")
+        chrome_options.add_argument("--disable-renderer-backgrounding")
+        
         # Docker/Server configuration
         is_headless = os.getenv("CHROME_HEADLESS", "false").lower() == "true"
         
@@ -176,7 +654,7 @@ OUTPUT (just the message):"""
             chrome_options.add_argument("--disable-blink-features=AutomationControlled")
             chrome_options.add_argument("--disable-infobars")
             chrome_options.add_argument("--enable-features=NetworkService,NetworkServiceInProcess")
-            chrome_options.add_argument("--disable-features=VizDisplayCompositor")
+            chrome_options.add_argument("--disable-features=VizDisplayCompositor,TranslateUI,MediaRouter")
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option("useAutomationExtension", False)
             
@@ -201,6 +679,8 @@ OUTPUT (just the message):"""
         else:
             print("[INFO] 🖥️ Running Chrome in GUI mode (Local)")
             chrome_options.add_argument("--start-maximized")
+            chrome_options.add_argument("--disable-gpu")
+            chrome_options.add_argument("--disable-features=TranslateUI,MediaRouter")
             chrome_options.add_argument("--disable-notifications")
             chrome_options.add_argument("--disable-popup-blocking")
             chrome_options.add_experimental_option("detach", True)
@@ -223,30 +703,51 @@ OUTPUT (just the message):"""
             print(f"[ERROR] Failed to start Chrome: {e}")
             print("Ensure Chrome is installed and CHROME_HEADLESS is set correctly.")
             raise e
-            
+        
+        _DRIVER_POOL[_driver_pool_key(self.user_id)] = self.driver
+        return self._prepare_driver()
+    
+    def _prepare_driver(self):
+        """Build the reusable waits for the current driver."""
+        # Reusable waits for the send path
+        self._send_wait = WebDriverWait(self.driver, 15)
+        self._tick_wait = WebDriverWait(self.driver, 10)
+        self._search_wait = WebDriverWait(self.driver, 5)
+        # Search results re-render while they load, so stale rows are retried
+        self._chat_wait = WebDriverWait(
+            self.driver, RESIDENT_CHAT_WAIT, ignored_exceptions=(StaleElementReferenceException,)
+        )
+        
         return self.driver
     
     async def _wait_for_whatsapp_ready(self):
         """Wait for WhatsApp Web to be ready (QR scanned or session restored)."""
         await self._log("Opening WhatsApp Web sandbox...", "system")
-        self.driver.get("https://web.whatsapp.com")
+        await self._run_driver(self.driver.get, "https://web.whatsapp.com")
         
         await self._log("Waiting for WhatsApp to connect (scan QR if needed)...", "system")
-        await self.broadcast({"type": "qr_waiting", "message": "Please scan QR code if prompted"})
+        await self._emit({"type": "qr_waiting", "message": "Please scan QR code if prompted"})
         
-        # Save QR screenshot for remote viewing
+        # Keep QR screenshots in memory for remote viewing - only when the QR changes
         try:
-            await asyncio.sleep(10)  # Wait for QR to render (increased from 5s)
-            qr_path = os.path.join(os.path.dirname(__file__), "uploads", "qr_code.png")
-            self.driver.save_screenshot(qr_path)
-            await self._log("📸 QR code screenshot saved. Check /api/whatsapp/qr", "info")
-            await self.broadcast({"type": "qr_ready", "message": "QR code available at /api/whatsapp/qr"})
-            
-            # Take additional screenshots as QR may update
-            for i in range(3):
-                await asyncio.sleep(5)
-                self.driver.save_screenshot(qr_path)
-                await self.broadcast({"type": "qr_updated", "message": "QR refreshed"})
+            await self._run_driver(self.driver.execute_script, QR_OBSERVER_JS)
+            qr_seen = False
+            deadline = time.monotonic() + QR_WAIT_TIMEOUT
+            while time.monotonic() < deadline:
+                ref, ready = await self._run_driver(self.driver.execute_script, QR_POLL_JS)
+                if ready:
+                    qr_provider.clear(self.user_id)  # Scanned - the old QR is useless now
+                    break
+                if ref:
+                    png = await self._run_driver(self.driver.get_screenshot_as_png)
+                    qr_provider.update(self.user_id, png)
+                    if not qr_seen:
+                        qr_seen = True
+                        await self._log("📸 QR code screenshot captured. Check /api/whatsapp/qr", "info")
+                        await self._emit({"type": "qr_ready", "message": "QR code available at /api/whatsapp/qr"})
+                    else:
+                        await self._emit({"type": "qr_updated", "message": "QR refreshed"})
+                await asyncio.sleep(QR_POLL_INTERVAL)
         except Exception as e:
             await self._log(f"⚠️ Could not save QR screenshot: {e}", "warning")
         
@@ -264,11 +765,12 @@ OUTPUT (just the message):"""
             logged_in = False
             for selector in login_selectors:
                 try:
-                    WebDriverWait(self.driver, 30).until(
+                    await self._run_driver(
+                        WebDriverWait(self.driver, 30).until,
                         EC.presence_of_element_located((By.XPATH, selector))
                     )
                     await self._log(f"✅ WhatsApp Web connected! (detected via: {selector[:30]}...)", "success")
-                    await self.broadcast({"type": "whatsapp_ready", "message": "WhatsApp connected"})
+                    await self._emit({"type": "whatsapp_ready", "message": "WhatsApp connected"})
                     logged_in = True
                     break
                 except:
@@ -277,9 +779,10 @@ OUTPUT (just the message):"""
             if not logged_in:
                 # Final attempt - just check page title
                 await asyncio.sleep(5)
-                if "WhatsApp" in self.driver.title:
+                title = await self._run_driver(lambda: self.driver.title)
+                if "WhatsApp" in title:
                     await self._log("✅ WhatsApp Web appears to be connected!", "success")
-                    await self.broadcast({"type": "whatsapp_ready", "message": "WhatsApp connected"})
+                    await self._emit({"type": "whatsapp_ready", "message": "WhatsApp connected"})
                     return True
                 raise Exception("Could not detect WhatsApp login state")
             
@@ -288,49 +791,237 @@ OUTPUT (just the message):"""
             await self._log(f"❌ WhatsApp connection failed: {e}", "error")
             return False
     
-    async def _send_message(self, phone: str, message: str) -> bool:
-        """Send a single WhatsApp message."""
+    def _open_chat_resident(self, phone: str):
+        """
+        Open a chat from the loaded WhatsApp app using the search box (no page reload).
+        Returns the message box, or None unless a chat titled with exactly this
+        number could be opened (the caller then falls back to the /send URL).
+        """
+        def exact_result(driver):
+            # Results load asynchronously; only a row titled with this exact number counts
+            for title in driver.find_elements(*SEARCH_RESULT_TITLES):
+                if _title_digits(title) == phone:
+                    return title
+            return False
+        
+        def chat_opened(driver):
+            boxes = driver.find_elements(*MESSAGE_BOX)
+            headers = driver.find_elements(*CHAT_HEADER_TITLE)
+            if boxes and headers and _title_digits(headers[0]) == phone:
+                return boxes[0]
+            return False
+        
+        search = None
         try:
-            # Format phone number
-            clean_phone = ''.join(filter(str.isdigit, phone))
-            if len(clean_phone) == 10:
-                clean_phone = "91" + clean_phone
-            
-            # Navigate to chat
-            encoded_msg = urllib.parse.quote(message)
-            url = f"https://web.whatsapp.com/send?phone={clean_phone}&text={encoded_msg}"
-            self.driver.get(url)
-            
-            # Wait for message input to be ready
-            await asyncio.sleep(3)
-            
-            # Find and click send button
-            send_button = WebDriverWait(self.driver, 15).until(
-                EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]'))
-            )
-            send_button.click()
+            # Close the current chat first so a stale message box can't be mistaken
+            # for the searched contact's chat
+            self.driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
             
-            # Wait for message to be sent
-            await asyncio.sleep(2)
+            search = self._search_wait.until(EC.element_to_be_clickable(SEARCH_BOX))
+            search.click()
+            search.send_keys(Keys.CONTROL, "a")
+            search.send_keys(Keys.DELETE)
+            search.send_keys(phone[-10:])
             
+            self._chat_wait.until(exact_result).click()
+            # Never paste before the header confirms this is the voter's chat
+            return self._chat_wait.until(chat_opened)
+        except RESIDENT_LOOKUP_ERRORS:
+            # Search box not found, no exact result, or a result row re-rendered
+            # under the click: let the caller use the /send URL instead
+            if search is not None:
+                try:
+                    search.send_keys(Keys.CONTROL, "a")
+                    search.send_keys(Keys.DELETE)
+                except RESIDENT_LOOKUP_ERRORS:
+                    pass
+            return None
+    
+    def _send_message_sync(self, phone: str, message: str, encoded_msg: str):
+        """Open the chat, send the message and wait for WhatsApp to acknowledge (blocking)."""
+        message_box = None
+        if self._resident_send:
+            message_box = self._open_chat_resident(phone)
+            if message_box is not None:
+                self._resident_misses = 0
+            else:
+                self._resident_misses += 1
+                if self._resident_misses >= RESIDENT_MISS_LIMIT:
+                    # Most remaining voters aren't known chats - stop paying the
+                    # RESIDENT_CHAT_WAIT search per message before the URL fallback
+                    self._resident_send = False
+        
+        if message_box is not None:
+            sent_before = self.driver.execute_script(MESSAGE_OUT_COUNT_JS)
+            # insertText handles emoji and newlines, which send_keys can't type
+            self.driver.execute_script(
+                "arguments[0].focus(); document.execCommand('insertText', false, arguments[1]);",
+                message_box, message
+            )
+            message_box.send_keys(Keys.ENTER)
+        else:
+            # Not a known chat - navigate to the send URL
+            self.driver.get(f"https://web.whatsapp.com/send?phone={phone}&text={encoded_msg}")
+            
+            # Proceed as soon as the send button is clickable (polls every 500ms)
+            send_button = self._send_wait.until(EC.element_to_be_clickable(SEND_BUTTON))
+            sent_before = self.driver.execute_script(MESSAGE_OUT_COUNT_JS)
+            send_button.click()
+        
+        # Wait for the sent/delivered tick on the message we just sent
+        try:
+            self._tick_wait.until(EC.presence_of_element_located(
+                (By.XPATH, SENT_TICK_AFTER.format(sent_before))
+            ))
+        except TimeoutException:
+            pass  # Send was clicked; a slow tick isn't a failure
+    
+    async def _send_message(self, phone: str, message: str, encoded_msg: str) -> bool:
+        """
+        Send a single WhatsApp message.
+        Expects a normalized phone (see _normalize_phones), the message text and
+        its URL-encoded form (used when the chat has to be opened by URL).
+        """
+        try:
+            # Selenium calls block, so run them off the event loop
+            await self._run_driver(self._send_message_sync, phone, message, encoded_msg)
             return True
             
         except Exception as e:
             await self._log(f"❌ Failed to send to {phone}: {str(e)[:50]}", "error")
             return False
     
+    async def _produce_messages(self, voters: List[Dict], queue: asyncio.Queue):
+        """
+        Render each voter's message and feed it to the send worker (bounded queue).
+        Not wrapped in try/finally: if the worker dies, this task is cancelled
+        while blocked on put(), and a stop marker would block the same way.
+        """
+        for i, voter in enumerate(voters, 1):
+            if self.should_stop:
+                break
+            name = voter["NAME"]
+            # Rotate through the AI variant pool (just the base message if AI is off)
+            await queue.put((
+                i, voter["_PHONE"], name,
+                self._render_variant(i - 1, name),
+                self._encoded_variant(i - 1, name)
+            ))
+        await queue.put(None)  # Stop marker for the worker
+    
+    async def _send_worker(self, queue: asyncio.Queue):
+        """Send messages for queued voters, one at a time on the driver thread."""
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if self.should_stop:
+                continue  # Keep draining so the producer can finish
+            i, phone, name, message, encoded_msg = item
+            
+            await self._resume_event.wait()
+            if self.should_stop:
+                continue
+            
+            started = time.monotonic()
+            success = await self._send_message(phone, message, encoded_msg)
+            
+            if success:
+                self.stats["sent"] += 1
+            else:
+                self.stats["failed"] += 1
+            await self._progress(i, name, phone, "sent" if success else "failed")
+            
+            await self._update_stats()
+            
+            # Jittered spacing between sends; time already spent sending counts
+            # towards it, so slow sends aren't followed by a full extra wait
+            if i < self.stats["total"]:
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(max(0.0, random.uniform(SEND_INTERVAL_MIN, SEND_INTERVAL_MAX) - elapsed))
+    
     def stop(self):
         """Stop the campaign."""
         self.should_stop = True
         self.is_running = False
+        if self._resume_event:
+            self._resume_event.set()  # Wake a paused worker so it can exit
     
     def pause(self):
         """Pause the campaign."""
         self.is_paused = True
+        if self._resume_event:
+            self._resume_event.clear()
     
     def resume(self):
         """Resume the campaign."""
         self.is_paused = False
+        if self._resume_event:
+            self._resume_event.set()
+    
+    def _normalize_phones(self, voters: Iterable[Dict]) -> List[Dict]:
+        """
+        Clean MOBILE numbers for all voters in bulk passes (see phone_utils).
+        Keeps voters with a 10 or 12 digit number as slim {NAME, _PHONE} records,
+        where _PHONE is the WhatsApp-ready (91-prefixed) number. Rows are consumed
+        in chunks of NORMALIZE_CHUNK_SIZE, so only the slim records of valid
+        voters accumulate - never the full sheet.
+        """
+        from phone_utils import normalize_phones
+        
+        valid = []
+        names, mobiles = [], []
+        
+        def flush():
+            valid.extend(
+                {"NAME": name, "_PHONE": phone}
+                for name, phone in zip(names, normalize_phones(mobiles))
+                if phone
+            )
+            names.clear()
+            mobiles.clear()
+        
+        for v in voters:
+            mobile = v.get("MOBILE")
+            if mobile is None or str(mobile).strip() in SKIP_MOBILES:
+                continue  # Placeholder from extraction - no number to clean
+            names.append(str(v.get("NAME") or "Voter"))
+            mobiles.append(mobile)
+            if len(mobiles) >= NORMALIZE_CHUNK_SIZE:
+                flush()
+        flush()
+        return valid
+    
+    def _iter_excel_rows(self, excel_file: str):
+        """Stream voter rows from an Excel sheet as dicts keyed by the header row."""
+        if CALAMINE_AVAILABLE:
+            rows = CalamineWorkbook.from_path(excel_file).get_sheet_by_index(0).iter_rows()
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(h).strip() for h in header]
+            for row in rows:
+                yield dict(zip(header, row))
+            return
+        
+        if not excel_file.lower().endswith(('.xlsx', '.xlsm')):
+            # openpyxl can't read legacy .xls files
+            import pandas as pd
+            yield from pd.read_excel(excel_file).to_dict('records')
+            return
+        
+        import openpyxl
+        wb = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = [str(h).strip() if h is not None else "" for h in header]
+            for row in rows:
+                yield dict(zip(header, row))
+        finally:
+            wb.close()
     
     def get_status(self) -> Dict[str, Any]:
         """Get current campaign status."""
@@ -341,6 +1032,10 @@ OUTPUT (just the message):"""
             "stats": self.stats
         }
     
+    def browser_lock(self) -> asyncio.Lock:
+        """Lock for this user's pooled browser (one running campaign per browser)."""
+        return _driver_pool_lock(_driver_pool_key(self.user_id))
+    
     async def execute_campaign(
         self,
         excel_file: Optional[str] = None,
@@ -358,9 +1053,13 @@ OUTPUT (just the message):"""
         Args:
             excel_file: Path to Excel file with voters
             voters_data: Direct list of voter records
+        
+        Callers hold browser_lock() around this, so only one campaign drives a
+        user's browser at a time.
         """
         self.is_running = True
         self.should_stop = False
+        self._start_flusher()
         
         try:
             await self._log("🚀 Initializing VoteFlow Campaign Engine...", "system")
@@ -368,21 +1067,20 @@ OUTPUT (just the message):"""
             # Load voter data
             if excel_file:
                 await self._log(f"📂 Loading voters from: {excel_file}", "info")
-                df = pd.read_excel(excel_file)
-                voters = df.to_dict('records')
+                voters = self._iter_excel_rows(excel_file)
             elif voters_data:
                 voters = voters_data
             else:
                 await self._log("❌ No voter data provided!", "error")
                 return
             
-            # Filter voters with valid mobile numbers
-            valid_voters = [
-                v for v in voters 
-                if v.get("MOBILE") and str(v["MOBILE"]) not in ["N/A", "UNCLEAR", "nan", ""]
-            ]
+            # Filter voters with valid mobile numbers and normalize them in bulk passes
+            valid_voters = self._normalize_phones(voters)
+            if self.quota_remaining is not None:
+                valid_voters = valid_voters[:self.quota_remaining]  # Never send past the reserved quota
             
             self.stats["total"] = len(valid_voters)
+            self._total_inv = 100.0 / max(len(valid_voters), 1)
             await self._log(f"📊 Found {len(valid_voters)} voters with valid mobile numbers", "info")
             await self._update_stats()
             
@@ -390,19 +1088,29 @@ OUTPUT (just the message):"""
                 await self._log("⚠️ No voters with valid mobile numbers found!", "warning")
                 return
             
+            # Initialize browser sandbox in a thread while the AI prepares messages
+            await self._log("🌐 Starting WhatsApp sandbox...", "system")
+            browser_task = asyncio.create_task(self._run_driver(self._init_browser))
+            
             # Process base message with AI
             if self.gemini_model and self.use_ai:
                 await self._log("🤖 AI Engine: Processing your message template...", "system")
                 await self._log(f"📝 Base message received: {self.base_message[:50]}...", "info")
+                await self._process_message_batch(
+                    self.base_message,
+                    [v["NAME"] for v in valid_voters[:32]]
+                )
+                await self._log(f"🤖 AI generated {len(self._variant_pool)} message variations", "info")
             else:
                 await self._log("📝 Using message as-is (AI processing disabled)", "info")
             
-            # Initialize browser sandbox
-            await self._log("🌐 Starting WhatsApp sandbox...", "system")
-            self._init_browser()
+            await browser_task
             
-            # Wait for WhatsApp to be ready
-            if not await self._wait_for_whatsapp_ready():
+            # Wait for WhatsApp to be ready (a warm pooled session already is)
+            if self._session_warm:
+                await self._log("✅ WhatsApp session already connected", "success")
+                await self._emit({"type": "whatsapp_ready", "message": "WhatsApp connected"})
+            elif not await self._wait_for_whatsapp_ready():
                 await self._log("❌ Failed to connect to WhatsApp. Aborting.", "error")
                 return
             
@@ -411,59 +1119,50 @@ OUTPUT (just the message):"""
             # Send messages
             await self._log("📤 Starting message broadcast...", "system")
             
-            for i, voter in enumerate(valid_voters, 1):
-                if self.should_stop:
-                    await self._log("⏹️ Campaign stopped by user", "warning")
-                    break
-                
-                while self.is_paused:
-                    await asyncio.sleep(1)
-                
-                phone = str(voter["MOBILE"])
-                name = voter.get("NAME", "Voter")
-                
-                # AI processes each message with slight variations
-                if self.gemini_model and self.use_ai:
-                    message = await self._process_message_with_ai(self.base_message, name)
-                    await self._log(f"🤖 AI generated message for {name}", "info")
-                else:
-                    message = self.base_message
-                
-                await self._log(f"📤 [{i}/{len(valid_voters)}] Sending to {name} ({phone})...", "info")
-                
-                # Send message
-                success = await self._send_message(phone, message)
-                
-                if success:
-                    self.stats["sent"] += 1
-                    await self._log(f"✅ Sent to {phone}", "success")
-                else:
-                    self.stats["failed"] += 1
-                
-                await self._update_stats()
-                
-                # Delay between messages
-                if i < len(valid_voters):
-                    await asyncio.sleep(4)
+            send_queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+            self._resume_event = asyncio.Event()
+            if not self.is_paused:
+                self._resume_event.set()
+            pipeline = [
+                asyncio.create_task(self._produce_messages(valid_voters, send_queue)),
+                asyncio.create_task(self._send_worker(send_queue)),
+            ]
+            try:
+                await asyncio.gather(*pipeline)
+            finally:
+                # If one side failed (or we were cancelled), stop the other instead of
+                # leaving it blocked on the queue or still rendering messages
+                for task in pipeline:
+                    task.cancel()
+                await asyncio.gather(*pipeline, return_exceptions=True)
+            
+            if self.should_stop:
+                await self._log("⏹️ Campaign stopped by user", "warning")
+            
+            await self._update_stats()
             
             # Campaign complete
             await self._log(f"🏁 Campaign complete! Sent: {self.stats['sent']}, Failed: {self.stats['failed']}", "success")
-            await self.broadcast({"type": "complete", "stats": self.stats})
+            await self._emit({"type": "complete", "stats": dict(self.stats)})
             
         except Exception as e:
             await self._log(f"💥 Campaign error: {str(e)}", "error")
-            await self.broadcast({"type": "error", "message": str(e)})
+            await self._emit({"type": "error", "message": str(e)})
         
         finally:
             self.is_running = False
             if self.driver:
                 await self._log("🌐 WhatsApp sandbox will remain open for next campaign", "system")
+            if self._driver_exec:
+                self._driver_exec.shutdown(wait=False)
+                self._driver_exec = None
+            await self._stop_flusher()
 
 
 # For standalone testing
 if __name__ == "__main__":
     async def test_broadcast(msg):
-        print(f"[BROADCAST] {json.dumps(msg, indent=2)}")
+        print(f"[BROADCAST] {json_dumps(msg, indent=True).decode()}")
     
     runner = CampaignRunner(
         campaign_id="test-001",
@@ -4,15 +4,51 @@ Multi-user support with payment tracking and quota management.
 """
 
 import os
+import functools
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Enum
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Enum, Index, event, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import StaticPool
 import enum
 
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./voteflow.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+
+if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+    # In-memory SQLite lives in a single connection, so share it across threads
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+elif "sqlite" in DATABASE_URL:
+    # File SQLite keeps the default pool - one connection per session/thread
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    # Server databases: reuse warm connections, drop stale ones
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
+
+
+if "sqlite" in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets campaign writers and dashboard readers work concurrently."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+        cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -83,7 +119,7 @@ class Payment(Base):
     
     # Razorpay details
     razorpay_order_id = Column(String, unique=True)
-    razorpay_payment_id = Column(String, nullable=True)
+    razorpay_payment_id = Column(String, nullable=True)  # Unique (see __table_args__) so IDs can't be reused
     razorpay_signature = Column(String, nullable=True)
     
     # Status
@@ -95,6 +131,11 @@ class Payment(Base):
     
     # Relationships
     user = relationship("User", back_populates="payments")
+    
+    __table_args__ = (
+        # NULLs (pending orders) don't collide; a reused payment ID fails the insert
+        Index("uq_payment_razorpay_payment_id", "razorpay_payment_id", unique=True),
+    )
 
 
 class Campaign(Base):
@@ -126,7 +167,7 @@ class Campaign(Base):
 
 # Database helper functions
 def get_db():
-    """Get database session."""
+    """Get database session (FastAPI dependency - one session per request)."""
     db = SessionLocal()
     try:
         yield db
@@ -137,6 +178,13 @@ def get_db():
 def init_db():
     """Initialize database tables."""
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist; add the uniqueness guard there too
+    for index in Payment.__table__.indexes:
+        if index.unique:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:  # e.g. duplicates already stored
+                print(f"[DB] ⚠️ Could not create {index.name}: {e}")
     print("[DB] ✅ Database tables created successfully")
 
 
@@ -146,7 +194,12 @@ def get_user_by_clerk_id(db, clerk_user_id: str) -> User:
     if not user:
         user = User(clerk_user_id=clerk_user_id)
         db.add(user)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request created this user first (handlers run in worker threads)
+            db.rollback()
+            return db.query(User).filter(User.clerk_user_id == clerk_user_id).one()
         db.refresh(user)
     return user
 
@@ -164,13 +217,32 @@ def get_user_quota(db, clerk_user_id: str) -> dict:
 
 def decrement_quota(db, clerk_user_id: str, count: int = 1) -> bool:
     """Decrement user's message quota. Returns False if insufficient quota."""
-    user = get_user_by_clerk_id(db, clerk_user_id)
-    if user.messages_remaining < count:
-        return False
-    user.messages_remaining -= count
-    user.total_messages_sent += count
+    # Single atomic UPDATE - the quota check and decrement can't race
+    result = db.execute(
+        update(User)
+        .where(User.clerk_user_id == clerk_user_id, User.messages_remaining >= count)
+        .values(
+            messages_remaining=User.messages_remaining - count,
+            total_messages_sent=User.total_messages_sent + count
+        )
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def refund_quota(db, clerk_user_id: str, count: int):
+    """Give back messages reserved with decrement_quota that were never sent."""
+    if count <= 0:
+        return
+    db.execute(
+        update(User)
+        .where(User.clerk_user_id == clerk_user_id)
+        .values(
+            messages_remaining=User.messages_remaining + count,
+            total_messages_sent=User.total_messages_sent - count
+        )
+    )
     db.commit()
-    return True
 
 
 def add_quota(db, clerk_user_id: str, package_type: str) -> int:
@@ -184,10 +256,14 @@ def add_quota(db, clerk_user_id: str, package_type: str) -> int:
     return user.messages_remaining
 
 
+CHROME_PROFILES_BASE = os.getenv("CHROME_PROFILES_BASE", "/data/chrome-profiles")
+
+
+# Memoized so makedirs runs once per user; bounded so the cache can't grow without limit
+@functools.lru_cache(maxsize=10000)
 def get_user_chrome_profile(clerk_user_id: str) -> str:
     """Get the Chrome profile directory path for a user."""
-    base_path = os.getenv("CHROME_PROFILES_BASE", "/data/chrome-profiles")
-    profile_path = os.path.join(base_path, clerk_user_id)
+    profile_path = os.path.join(CHROME_PROFILES_BASE, clerk_user_id)
     os.makedirs(profile_path, exist_ok=True)
     return profile_path
 
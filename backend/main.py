@@ -8,28 +8,66 @@ Multi-user support with payment tracking and quota management.
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, BackgroundTasks, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pydantic import BaseModel, validator
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 import asyncio
 import json
 import os
 import re
 import html
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 import uuid
-from collections import defaultdict
 import time
 import razorpay
+import aiofiles
 import hmac
 import hashlib
+import secrets
+import threading
+import itertools
+import array
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# orjson is ~3-5x faster than stdlib json; fall back if it isn't installed
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Hyperscan scans for all injection patterns in one pass; re is the fallback
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+# python-calamine (Rust) parses uploaded sheets much faster than openpyxl
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
+
+# Redis shares rate-limit buckets across workers/replicas (used when REDIS_URL is set)
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
 
 # Import our modules
-from campaign_runner import CampaignRunner
-from pdf_extractor import PDFExtractor
+from campaign_runner import CampaignRunner, qr_provider
+from phone_utils import clean_digits
 from database import (
     init_db, get_db, get_user_by_clerk_id, get_user_quota, 
-    decrement_quota, add_quota, get_user_chrome_profile,
+    decrement_quota, refund_quota, add_quota, get_user_chrome_profile,
     PACKAGE_LIMITS, PackageType, User, Payment, PaymentStatus, SessionLocal
 )
 
@@ -42,7 +80,11 @@ RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID", "")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "")
 razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET)) if RAZORPAY_KEY_ID else None
 
+# orjson-backed responses (bytes straight from the encoder) when orjson is installed
+APIResponse = ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+
 app = FastAPI(
+    default_response_class=APIResponse,
     title="VoteFlow AI Backend",
     description="Campaign execution and PDF extraction API with multi-user support",
     version="2.0.0"
@@ -53,6 +95,15 @@ app = FastAPI(
 async def startup_event():
     init_db()
     print("[DB] ✅ Database initialized")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+    if _pdf_extractor is not None:
+        from pdf_extractor import shutdown_render_pool
+        shutdown_render_pool()
 
 # CORS for React frontend
 app.add_middleware(
@@ -69,30 +120,144 @@ app.add_middleware(
 # =============================================================================
 
 class RateLimiter:
-    def __init__(self, max_requests: int = 10, time_window: int = 60):
+    """
+    Token bucket per IP: max_requests burst, refilled evenly over time_window.
+    IPs are hashed into a fixed array of buckets, so memory stays bounded no
+    matter how many addresses show up (colliding IPs share a bucket).
+    """
+    def __init__(self, max_requests: int = 10, time_window: int = 60, slots: int = 1 << 17):
         self.max_requests = max_requests
         self.time_window = time_window
-        self.requests = defaultdict(list)
+        self.refill_rate = max_requests / time_window  # tokens per second
+        self.mask = slots - 1  # slots must be a power of two
+        self.tokens = array.array('d', [float(max_requests)]) * slots
+        self.last = array.array('d', [0.0]) * slots  # last refill (time.monotonic)
     
     def is_allowed(self, client_ip: str) -> bool:
-        now = time.time()
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if now - req_time < self.time_window
-        ]
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.max_requests:
+        idx = hash(client_ip) & self.mask
+        now = time.monotonic()
+        tokens = min(self.max_requests, self.tokens[idx] + (now - self.last[idx]) * self.refill_rate)
+        self.last[idx] = now
+        if tokens < 1:
+            self.tokens[idx] = tokens
             return False
-        self.requests[client_ip].append(now)
+        self.tokens[idx] = tokens - 1
         return True
 
+class RedisRateLimiter:
+    """Same token bucket, stored in Redis so every worker/replica shares one limit per IP."""
+    # KEYS[1] = bucket key; ARGV = capacity, refill per ms, now (ms), cost
+    TOKEN_BUCKET_LUA = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+    return allowed
+    """
+    
+    def __init__(self, url: str, max_requests: int = 10, time_window: int = 60):
+        self.max_requests = max_requests
+        self.refill_per_ms = max_requests / (time_window * 1000)
+        # Short timeouts: a hung Redis must not stall every rate-limited request
+        self.redis = aioredis.from_url(
+            url, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+        )
+        self._script = self.redis.register_script(self.TOKEN_BUCKET_LUA)
+        # While Redis is failing, requests skip it until this time (time.monotonic)
+        self.skip_until = 0.0
+    
+    async def is_allowed(self, client_ip: str) -> bool:
+        allowed = await self._script(
+            keys=[f"rl:{client_ip}"],
+            args=[self.max_requests, self.refill_per_ms, int(time.time() * 1000), 1]
+        )
+        return allowed == 1
+
 rate_limiter = RateLimiter(max_requests=30, time_window=60)  # 30 requests per minute
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))  # seconds, connect and per command
+REDIS_RETRY_INTERVAL = 30  # seconds on the local limiter after a Redis failure
+shared_rate_limiter = (
+    RedisRateLimiter(REDIS_URL, max_requests=30, time_window=60)
+    if REDIS_AVAILABLE and REDIS_URL else None
+)
+
+async def enforce_rate_limit(request: Request):
+    """Route dependency: 429 once the client IP is over its limit."""
+    client_ip = request.client.host
+    allowed = None
+    if shared_rate_limiter is not None and time.monotonic() >= shared_rate_limiter.skip_until:
+        try:
+            allowed = await shared_rate_limiter.is_allowed(client_ip)
+        except Exception as e:
+            shared_rate_limiter.skip_until = time.monotonic() + REDIS_RETRY_INTERVAL
+            print(f"[RATE LIMIT] ⚠️ Redis unavailable, using local limiter for {REDIS_RETRY_INTERVAL}s: {e}")
+    if allowed is None:
+        allowed = rate_limiter.is_allowed(client_ip)
+    if not allowed:
+        raise HTTPException(status_code=429, detail="Too many requests. Please wait.")
 
 # =============================================================================
 # Security: Input Sanitization
 # =============================================================================
 
+# Potential SQL injection patterns, compiled once. Applied in order, as removing
+# one pattern (e.g. ";") can expose another ("DROP ; TABLE" -> "DROP  TABLE").
+DANGEROUS_PATTERN_SOURCES = (
+    r"(\-\-)", r"(\/\*)", r"(\*\/)", r"(;)",
+    r"(DROP\s+TABLE)", r"(DELETE\s+FROM)", r"(INSERT\s+INTO)",
+    r"(UPDATE\s+\w+\s+SET)", r"(UNION\s+SELECT)"
+)
+DANGEROUS_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in DANGEROUS_PATTERN_SOURCES]
+
+# Single-pass pre-filter: if nothing matches, the sequential removals are a no-op
+# and can be skipped (the common case for ordinary messages)
+if HYPERSCAN_AVAILABLE:
+    _dangerous_db = hyperscan.Database()
+    _dangerous_db.compile(
+        expressions=[p.encode() for p in DANGEROUS_PATTERN_SOURCES],
+        ids=list(range(len(DANGEROUS_PATTERN_SOURCES))),
+        flags=[
+            hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH
+            | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+        ] * len(DANGEROUS_PATTERN_SOURCES)
+    )
+else:
+    _dangerous_any = re.compile("|".join(DANGEROUS_PATTERN_SOURCES), re.IGNORECASE)
+
+def _has_dangerous_pattern(text: str) -> bool:
+    """True if any DANGEROUS_PATTERNS entry matches somewhere in text."""
+    if HYPERSCAN_AVAILABLE:
+        try:
+            data = text.encode("utf-8")
+        except UnicodeEncodeError:
+            return True  # Lone surrogates - let the regex path handle it
+        matches = []
+        _dangerous_db.scan(data, match_event_handler=lambda *args: matches.append(args[0]))
+        return bool(matches)
+    return _dangerous_any.search(text) is not None
+
+# Other per-request / per-voter patterns, compiled once
+UNSAFE_FILENAME_RE = re.compile(r'[^\w\-.]')
+PAYMENT_ID_RE = re.compile(r'pay_[a-zA-Z0-9]{10,30}')  # Use with fullmatch (\Z-anchored, unlike $)
+CAMPAIGN_ID_CHARS = frozenset("0123456789abcdef-")  # Campaign IDs are uuid4()[:8]
+
+def is_valid_campaign_id(campaign_id: str) -> bool:
+    return len(campaign_id) == 8 and CAMPAIGN_ID_CHARS.issuperset(campaign_id)
+
+HTML_SPECIAL_CHARS = frozenset('&<>"\'')  # Everything html.escape rewrites
+
 def sanitize_string(input_str: str, max_length: int = 1000) -> str:
     """Sanitize string input to prevent XSS and injection attacks."""
     if not input_str:
@@ -101,23 +266,21 @@ def sanitize_string(input_str: str, max_length: int = 1000) -> str:
     # Truncate to max length
     input_str = input_str[:max_length]
     
-    # HTML escape
-    input_str = html.escape(input_str)
+    # HTML escape (a no-op unless one of &<>"' is present, so skip it for plain text)
+    if not HTML_SPECIAL_CHARS.isdisjoint(input_str):
+        input_str = html.escape(input_str)
     
     # Remove potential SQL injection patterns
-    dangerous_patterns = [
-        r"(\-\-)", r"(\/\*)", r"(\*\/)", r"(;)",
-        r"(DROP\s+TABLE)", r"(DELETE\s+FROM)", r"(INSERT\s+INTO)",
-        r"(UPDATE\s+\w+\s+SET)", r"(UNION\s+SELECT)"
-    ]
-    for pattern in dangerous_patterns:
-        input_str = re.sub(pattern, "", input_str, flags=re.IGNORECASE)
+    if not _has_dangerous_pattern(input_str):
+        return input_str
+    for pattern in DANGEROUS_PATTERNS:
+        input_str = pattern.sub("", input_str)
     
     return input_str
 
 def validate_phone_number(phone: str) -> bool:
     """Validate phone number format."""
-    clean_phone = re.sub(r'\D', '', phone)
+    clean_phone = clean_digits(phone)
     return len(clean_phone) == 10 or len(clean_phone) == 12
 
 # =============================================================================
@@ -152,34 +315,147 @@ class CampaignStartRequest(BaseModel):
 # =============================================================================
 
 active_campaigns: Dict[str, CampaignRunner] = {}
+
+# Each running campaign drives its own Chrome, so only a few run at once and the
+# rest wait their turn; beyond the queue limit new campaigns are rejected
+MAX_CONCURRENT_CAMPAIGNS = int(os.getenv("MAX_CONCURRENT_CAMPAIGNS", "4"))
+MAX_QUEUED_CAMPAIGNS = int(os.getenv("MAX_QUEUED_CAMPAIGNS", "16"))
+FINISHED_CAMPAIGN_TTL = 600  # Seconds a finished campaign stays queryable
+finished_campaigns: Dict[str, float] = {}  # campaign_id -> monotonic finish time
+_campaign_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_campaign_semaphore() -> asyncio.Semaphore:
+    """Concurrency limit for running campaigns (created on the running loop)."""
+    global _campaign_semaphore
+    if _campaign_semaphore is None:
+        _campaign_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CAMPAIGNS)
+    return _campaign_semaphore
+
+def _sweep_finished_campaigns():
+    """Forget campaigns that finished more than FINISHED_CAMPAIGN_TTL ago."""
+    cutoff = time.monotonic() - FINISHED_CAMPAIGN_TTL
+    for campaign_id in [cid for cid, done in finished_campaigns.items() if done <= cutoff]:
+        del finished_campaigns[campaign_id]
+        active_campaigns.pop(campaign_id, None)
 websocket_connections: Dict[str, List[WebSocket]] = {}
 
+# datetimes are treated as UTC; numpy scalars/arrays (from pandas sheets) serialize natively
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY if ORJSON_AVAILABLE else 0
+
+def _json_default(obj):
+    """Fallback for values the JSON encoder doesn't know (datetimes, numpy scalars)."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+def dumps_json(data) -> str:
+    """Serialize to a compact JSON string (orjson when available)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, default=_json_default, option=ORJSON_OPTIONS).decode()
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
 # =============================================================================
 # WebSocket Manager
 # =============================================================================
 
+BROADCAST_CHUNK_SIZE = 50  # Sends per gather before yielding to the loop
+OUTBOX_MAX_MESSAGES = 1024  # Per-campaign backlog waiting for the relay
+# Connection ack, pre-encoded; campaign IDs are validated hex/dash so they splice in safely
+CONNECTED_FRAME_TEMPLATE = dumps_json({
+    "type": "connected",
+    "campaign_id": "%s",
+    "message": "Connected to campaign log stream"
+})
+# Transport-level keepalive (uvicorn/websockets ping frames), in seconds
+WS_PING_INTERVAL = 20.0
+WS_PING_TIMEOUT = 20.0
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        # Sets give O(1) connect/disconnect; broadcasts iterate a cached tuple
+        # snapshot that is only rebuilt after the set changes
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self._snapshots: Dict[str, Tuple[WebSocket, ...]] = {}
+        # Per-campaign outbox + relay task: publish() never awaits a send, and
+        # whatever piles up while a send is in flight goes out as one frame
+        self._outboxes: Dict[str, asyncio.Queue] = {}
+        self._relays: Dict[str, asyncio.Task] = {}
 
     async def connect(self, websocket: WebSocket, campaign_id: str):
         await websocket.accept()
-        if campaign_id not in self.active_connections:
-            self.active_connections[campaign_id] = []
-        self.active_connections[campaign_id].append(websocket)
+        self.active_connections.setdefault(campaign_id, set()).add(websocket)
+        self._snapshots.pop(campaign_id, None)
 
     def disconnect(self, websocket: WebSocket, campaign_id: str):
-        if campaign_id in self.active_connections:
-            if websocket in self.active_connections[campaign_id]:
-                self.active_connections[campaign_id].remove(websocket)
+        connections = self.active_connections.get(campaign_id)
+        if connections is None:
+            return
+        connections.discard(websocket)
+        if not connections:
+            del self.active_connections[campaign_id]
+        self._snapshots.pop(campaign_id, None)
 
     async def broadcast(self, campaign_id: str, message: dict):
-        if campaign_id in self.active_connections:
-            for connection in self.active_connections[campaign_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
+        connections = self._snapshots.get(campaign_id)
+        if connections is None:
+            current = self.active_connections.get(campaign_id)
+            if not current:
+                return
+            connections = self._snapshots[campaign_id] = tuple(current)
+        # Serialize once, then fan out concurrently in chunks so large
+        # audiences don't stall the event loop
+        payload = dumps_json(message)
+        dead = []
+        for i in range(0, len(connections), BROADCAST_CHUNK_SIZE):
+            chunk = connections[i:i + BROADCAST_CHUNK_SIZE]
+            results = await asyncio.gather(
+                *(c.send_text(payload) for c in chunk),
+                return_exceptions=True
+            )
+            dead.extend(c for c, result in zip(chunk, results) if isinstance(result, Exception))
+            await asyncio.sleep(0)
+        # Drop sockets that failed so later broadcasts don't keep paying for them
+        for c in dead:
+            self.disconnect(c, campaign_id)
+
+    def publish(self, campaign_id: str, message: dict):
+        """Queue a message for the campaign's relay (safe to call without awaiting)."""
+        if campaign_id not in self.active_connections:
+            return  # Nobody listening - broadcast would drop it anyway
+        outbox = self._outboxes.get(campaign_id)
+        if outbox is None:
+            outbox = self._outboxes[campaign_id] = asyncio.Queue(maxsize=OUTBOX_MAX_MESSAGES)
+        if outbox.full():
+            outbox.get_nowait()  # Slow viewers: shed the oldest message, keep the newest
+        outbox.put_nowait(message)
+        relay = self._relays.get(campaign_id)
+        if relay is None or relay.done():
+            self._relays[campaign_id] = asyncio.create_task(self._relay(campaign_id, outbox))
+
+    async def _relay(self, campaign_id: str, outbox: asyncio.Queue):
+        """Drain the outbox, merging queued messages into one batch frame per send."""
+        while True:
+            messages = []
+            while not outbox.empty():
+                messages.append(outbox.get_nowait())
+            if not messages:
+                # Idle: drop the outbox so finished campaigns don't linger
+                self._outboxes.pop(campaign_id, None)
+                self._relays.pop(campaign_id, None)
+                return
+            if len(messages) == 1:
+                await self.broadcast(campaign_id, messages[0])
+                continue
+            events = []
+            for m in messages:
+                if m.get("type") == "batch":
+                    events.extend(m["events"])
+                else:
+                    events.append(m)
+            await self.broadcast(campaign_id, {"type": "batch", "events": events})
 
 manager = ConnectionManager()
 
@@ -187,84 +463,162 @@ manager = ConnectionManager()
 # REST API Endpoints
 # =============================================================================
 
+# Static bodies serialized once; probes hit these endpoints constantly
+ROOT_BODY = dumps_json({
+    "status": "online",
+    "service": "VoteFlow AI Backend",
+    "version": "1.0.0",
+    "security": "enabled",
+    "endpoints": {
+        "health": "/health",
+        "extract_pdf": "POST /api/extract-pdf",
+        "start_campaign": "POST /api/campaign/start",
+        "stop_campaign": "POST /api/campaign/{id}/stop",
+        "campaign_status": "GET /api/campaign/{id}/status",
+        "websocket": "WS /ws/campaign/{id}"
+    }
+}).encode()
+HEALTH_BODY_PREFIX = b'{"status":"healthy","timestamp":"'
+HEALTH_BODY_SUFFIX = b'"}'
+
 @app.get("/")
 async def root():
-    return {
-        "status": "online",
-        "service": "VoteFlow AI Backend",
-        "version": "1.0.0",
-        "security": "enabled",
-        "endpoints": {
-            "health": "/health",
-            "extract_pdf": "POST /api/extract-pdf",
-            "start_campaign": "POST /api/campaign/start",
-            "stop_campaign": "POST /api/campaign/{id}/stop",
-            "campaign_status": "GET /api/campaign/{id}/status",
-            "websocket": "WS /ws/campaign/{id}"
-        }
-    }
+    return Response(content=ROOT_BODY, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    # isoformat() is plain ASCII, so it can be spliced in without a JSON encode
+    timestamp = datetime.now().isoformat().encode()
+    return Response(content=HEALTH_BODY_PREFIX + timestamp + HEALTH_BODY_SUFFIX, media_type="application/json")
 
 # =============================================================================
 # PDF Extraction Endpoint (with security)
 # =============================================================================
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Temp storage for uploaded PDFs (created at startup), resolved once next to this module
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(status_code=400, detail="File size must be less than 10MB")
 
-@app.post("/api/extract-pdf")
-async def extract_pdf(request: Request, file: UploadFile = File(...)):
+async def read_upload_limited(file: UploadFile) -> bytes:
+    """Read an upload in chunks, rejecting it as soon as it passes MAX_FILE_SIZE."""
+    buf = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        buf.extend(chunk)
+        if len(buf) > MAX_FILE_SIZE:
+            raise _file_too_large()
+    return bytes(buf)
+
+async def save_upload_limited(file: UploadFile, path: str):
+    """Stream an upload straight to disk in chunks, enforcing MAX_FILE_SIZE."""
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise _file_too_large()
+                await f.write(chunk)
+    except BaseException:
+        await asyncio.to_thread(_remove_if_exists, path)
+        raise
+
+# CPU-bound upload parsing (sheet decoding, sanitize regexes) runs in worker
+# processes so the event loop keeps serving WebSockets and other requests
+PARSE_POOL_WORKERS = min(4, os.cpu_count() or 1)
+_parse_pool: Optional[ProcessPoolExecutor] = None
+INLINE_SANITIZE_MAX = 1000  # Smaller voter lists aren't worth the round-trip to the pool
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for upload parsing (started on first use). Workers are spawned,
+    not forked: the server already runs threads (threadpool handlers, driver
+    threads), and forking a threaded process can copy held locks into the child.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=PARSE_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+# One PDFExtractor (and its Gemini client) shared by every PDF upload;
+# built on the first upload so PyMuPDF/Gemini stay out of startup
+_pdf_extractor = None
+
+def _get_pdf_extractor():
+    """Shared PDFExtractor instance (created on first use)."""
+    global _pdf_extractor
+    if _pdf_extractor is None:
+        from pdf_extractor import PDFExtractor
+        _pdf_extractor = PDFExtractor()
+    return _pdf_extractor
+
+def _sanitize_extracted_voters(voters: List[dict]) -> List[dict]:
+    """Sanitize NAME/MOBILE of PDF-extracted voters (runs in the parse pool)."""
+    for voter in voters:
+        if 'NAME' in voter:
+            voter['NAME'] = sanitize_string(voter['NAME'], 100)
+        if 'MOBILE' in voter:
+            voter['MOBILE'] = clean_digits(str(voter['MOBILE']))[:12]
+    return voters
+
+def _sanitize_campaign_voters(voters: list, limit: int) -> List[dict]:
+    """Sanitize campaign voters, keeping only dicts with a valid mobile (runs in the parse pool)."""
+    digits, sanitize = clean_digits, sanitize_string  # Locals for the hot loops
+    cleaned = [
+        (voter, digits(str(voter.get('MOBILE', '')))[:12])
+        for voter in itertools.islice(voters, limit) if isinstance(voter, dict)  # Cap without copying
+    ]
+    # Mobiles are digits-only already, so validate_phone_number reduces to the length check
+    return [
+        {'NAME': sanitize(voter.get('NAME', ''), 100), 'MOBILE': mobile}
+        for voter, mobile in cleaned if len(mobile) in (10, 12)
+    ]
+
+@app.post("/api/extract-pdf", dependencies=[Depends(enforce_rate_limit)])
+async def extract_pdf(file: UploadFile = File(...)):
     """
     Upload a PDF with voter information (including handwritten mobile numbers).
     Uses Gemini Vision AI to extract all data including OCR for handwritten text.
     
     Security: Rate limited, file size limited, file type validated.
     """
-    # Rate limiting
-    client_ip = request.client.host
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(status_code=429, detail="Too many requests. Please wait.")
-    
     # File type validation
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted")
     
-    # Read file content
-    content = await file.read()
-    
-    # File size validation
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File size must be less than 10MB")
+    # Save uploaded file temporarily (streamed to disk, size-checked as it arrives)
+    # Secure filename
+    safe_filename = UNSAFE_FILENAME_RE.sub('_', file.filename)
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}_{safe_filename}")
+    await save_upload_limited(file, file_path)
     
     try:
-        # Save uploaded file temporarily
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Secure filename
-        safe_filename = re.sub(r'[^\w\-.]', '_', file.filename)
-        file_path = os.path.join(upload_dir, f"{uuid.uuid4()}_{safe_filename}")
-        
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Extract data using Gemini Vision
-        extractor = PDFExtractor()
-        result = await extractor.extract_voters(file_path)
-        
-        # Clean up temp file
-        os.remove(file_path)
+        try:
+            # Extract data using Gemini Vision
+            result = await _get_pdf_extractor().extract_voters(file_path)
+        finally:
+            # Clean up temp file (off the event loop)
+            await asyncio.to_thread(os.remove, file_path)
         
-        # Sanitize extracted data
-        for voter in result.get('voters', []):
-            if 'NAME' in voter:
-                voter['NAME'] = sanitize_string(voter['NAME'], 100)
-            if 'MOBILE' in voter:
-                voter['MOBILE'] = re.sub(r'\D', '', str(voter['MOBILE']))[:12]
+        # Sanitize extracted data (big lists in the parse pool, like campaign voters)
+        voters = result.get('voters', [])
+        if len(voters) > INLINE_SANITIZE_MAX:
+            result['voters'] = await asyncio.get_running_loop().run_in_executor(
+                _get_parse_pool(), _sanitize_extracted_voters, voters
+            )
+        else:
+            result['voters'] = _sanitize_extracted_voters(voters)
         
-        return JSONResponse({
+        return APIResponse({
             "success": True,
             "message": f"Extracted {len(result['voters'])} voters",
             "data": result
@@ -277,84 +631,101 @@ async def extract_pdf(request: Request, file: UploadFile = File(...)):
 # Excel Upload Endpoint (Quick Upload - No AI needed)
 # =============================================================================
 
-@app.post("/api/upload-excel")
-async def upload_excel(request: Request, file: UploadFile = File(...)):
+# Header keywords (substring match, same as the original keyword lists)
+NAME_HEADER_RE = re.compile('name|voter|పేరు')
+PHONE_HEADER_RE = re.compile('phone|mobile|number|ఫోన్|mob')
+
+def _iter_sheet_rows(content: bytes):
+    """Stream the first sheet's rows as value tuples/lists (calamine, else openpyxl read_only)."""
+    from io import BytesIO
+    
+    if CALAMINE_AVAILABLE:
+        yield from CalamineWorkbook.from_filelike(BytesIO(content)).get_sheet_by_index(0).iter_rows()
+        return
+    
+    import openpyxl
+    wb = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def _parse_excel_bytes(content: bytes) -> List[dict]:
+    """Parse an uploaded voter sheet into sanitized {NAME, MOBILE} records."""
+    rows = _iter_sheet_rows(content)
+    head = list(itertools.islice(rows, 5))
+    
+    voters = []
+    headers = []
+    name_col = None
+    phone_col = None
+    
+    # Find header row and column mappings
+    for row in head:
+        for col_idx, cell in enumerate(row):
+            if cell:
+                cell_lower = str(cell).lower().strip()
+                if NAME_HEADER_RE.search(cell_lower):
+                    name_col = col_idx
+                    headers = row
+                if PHONE_HEADER_RE.search(cell_lower):
+                    phone_col = col_idx
+        if name_col is not None:
+            break
+    
+    if name_col is None:
+        # Default to first two columns
+        name_col = 0
+        phone_col = 1
+    
+    if phone_col is None:
+        phone_col = 1
+    
+    # Extract data (the rows already read for the header scan come first)
+    start_row = 2 if headers else 1
+    for row in itertools.chain(head[start_row - 1:], rows):
+        if len(row) > max(name_col, phone_col) and row[name_col]:
+            name = str(row[name_col]).strip()
+            phone_cell = row[phone_col]
+            if isinstance(phone_cell, float) and phone_cell.is_integer():
+                phone_cell = int(phone_cell)  # calamine returns numeric cells as floats
+            phone_raw = str(phone_cell if phone_cell else '').strip()
+            phone = clean_digits(phone_raw)
+            
+            # Validate phone
+            if len(phone) == 10 and phone[0] in '6789':
+                voters.append({
+                    'NAME': sanitize_string(name, 100),
+                    'MOBILE': phone
+                })
+            elif len(phone) == 12 and phone.startswith('91'):
+                voters.append({
+                    'NAME': sanitize_string(name, 100),
+                    'MOBILE': phone[2:]  # Remove +91
+                })
+    
+    return voters
+
+@app.post("/api/upload-excel", dependencies=[Depends(enforce_rate_limit)])
+async def upload_excel(file: UploadFile = File(...)):
     """
     Upload an Excel file with pre-filled voter data (NAME and PHONE columns).
     This is a quick upload option that doesn't require AI processing.
     """
-    # Rate limiting
-    client_ip = request.client.host
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(status_code=429, detail="Too many requests. Please wait.")
-    
     # File type validation
     filename = file.filename.lower()
     if not (filename.endswith('.xlsx') or filename.endswith('.xls')):
         raise HTTPException(status_code=400, detail="Only Excel files (.xlsx, .xls) are accepted")
     
-    # Read file content
-    content = await file.read()
-    
-    # File size validation
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="File size must be less than 10MB")
+    # Read file content (chunked, size-checked as it arrives)
+    content = await read_upload_limited(file)
     
     try:
-        import openpyxl
-        from io import BytesIO
-        
-        # Load workbook
-        wb = openpyxl.load_workbook(BytesIO(content), data_only=True)
-        ws = wb.active
-        
-        voters = []
-        headers = []
-        name_col = None
-        phone_col = None
-        
-        # Find header row and column mappings
-        for row_idx, row in enumerate(ws.iter_rows(max_row=5, values_only=True)):
-            for col_idx, cell in enumerate(row):
-                if cell:
-                    cell_lower = str(cell).lower().strip()
-                    if any(n in cell_lower for n in ['name', 'voter', 'పేరు']):
-                        name_col = col_idx
-                        headers = row
-                    if any(p in cell_lower for p in ['phone', 'mobile', 'number', 'ఫోన్', 'mob']):
-                        phone_col = col_idx
-            if name_col is not None:
-                break
-        
-        if name_col is None:
-            # Default to first two columns
-            name_col = 0
-            phone_col = 1
-        
-        if phone_col is None:
-            phone_col = 1
-        
-        # Extract data
-        start_row = 2 if headers else 1
-        for row in ws.iter_rows(min_row=start_row, values_only=True):
-            if row[name_col] and len(row) > phone_col:
-                name = str(row[name_col]).strip()
-                phone_raw = str(row[phone_col] if row[phone_col] else '').strip()
-                phone = re.sub(r'\D', '', phone_raw)
-                
-                # Validate phone
-                if len(phone) == 10 and phone[0] in '6789':
-                    voters.append({
-                        'NAME': sanitize_string(name, 100),
-                        'MOBILE': phone
-                    })
-                elif len(phone) == 12 and phone.startswith('91'):
-                    voters.append({
-                        'NAME': sanitize_string(name, 100),
-                        'MOBILE': phone[2:]  # Remove +91
-                    })
+        voters = await asyncio.get_running_loop().run_in_executor(
+            _get_parse_pool(), _parse_excel_bytes, content
+        )
         
-        return JSONResponse({
+        return APIResponse({
             "success": True,
             "message": f"Loaded {len(voters)} voters from Excel",
             "voters": voters
@@ -369,16 +740,39 @@ async def upload_excel(request: Request, file: UploadFile = File(...)):
 # Payment Verification Endpoint
 # =============================================================================
 
-# Store verified payment IDs to prevent reuse
-verified_payments = set()
+# Recently verified payment IDs (bounded LRU in front of the Payment table, which
+# keeps the full history so reuse is still rejected after a restart). Keys are
+# salted 16-byte BLAKE2b digests, so entries are small and fixed-size.
+VERIFIED_PAYMENTS_MAX = 500_000
+_PAYMENT_KEY_SALT = secrets.token_bytes(16)
+verified_payments: "OrderedDict[bytes, None]" = OrderedDict()
+_verified_payments_lock = threading.Lock()
+
+def _payment_key(payment_id: str) -> bytes:
+    return hashlib.blake2b(payment_id.encode(), digest_size=16, key=_PAYMENT_KEY_SALT).digest()
+
+def _payment_seen(key: bytes) -> bool:
+    with _verified_payments_lock:
+        try:
+            verified_payments.move_to_end(key)  # Lookup and LRU touch in one step
+        except KeyError:
+            return False
+        return True
+
+def _remember_payment(key: bytes):
+    with _verified_payments_lock:
+        verified_payments[key] = None
+        verified_payments.move_to_end(key)
+        if len(verified_payments) > VERIFIED_PAYMENTS_MAX:
+            verified_payments.popitem(last=False)
 
 class PaymentVerifyRequest(BaseModel):
     payment_id: str
     plan_id: str
     amount: int
 
-@app.post("/api/verify-payment")
-async def verify_payment(request: Request, body: PaymentVerifyRequest):
+@app.post("/api/verify-payment", dependencies=[Depends(enforce_rate_limit)])
+def verify_payment(body: PaymentVerifyRequest, db: Session = Depends(get_db)):
     """
     Verify a Razorpay payment ID.
     
@@ -387,19 +781,18 @@ async def verify_payment(request: Request, body: PaymentVerifyRequest):
     
     Current implementation: Validates format and prevents reuse.
     """
-    # Rate limiting
-    client_ip = request.client.host
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(status_code=429, detail="Too many requests. Please wait.")
-    
     payment_id = body.payment_id.strip()
     
     # Validate payment ID format (Razorpay format: pay_xxxxxxxxxxxxxx)
-    if not re.match(r'^pay_[a-zA-Z0-9]{10,30}$', payment_id):
+    if not PAYMENT_ID_RE.fullmatch(payment_id):
         return {"verified": False, "message": "Invalid Payment ID format"}
     
-    # Check if already used
-    if payment_id in verified_payments:
+    # Check if already used (memory first, then the persisted history)
+    payment_key = _payment_key(payment_id)
+    if _payment_seen(payment_key):
+        return {"verified": False, "message": "This Payment ID has already been used"}
+    if db.query(Payment.id).filter(Payment.razorpay_payment_id == payment_id).first():
+        _remember_payment(payment_key)
         return {"verified": False, "message": "This Payment ID has already been used"}
     
     # For production: Add Razorpay API verification here
@@ -409,8 +802,23 @@ async def verify_payment(request: Request, body: PaymentVerifyRequest):
     # if payment['status'] != 'captured' or payment['amount'] != body.amount * 100:
     #     return {"verified": False, "message": "Payment not found or amount mismatch"}
     
-    # Mark as used
-    verified_payments.add(payment_id)
+    # Mark as used. The unique index on razorpay_payment_id makes this the real
+    # replay check: concurrent requests can all pass the lookups above, but only
+    # one insert commits.
+    db.add(Payment(
+        amount=body.amount,
+        package_type=body.plan_id,
+        razorpay_payment_id=payment_id,
+        status=PaymentStatus.COMPLETED.value,
+        completed_at=datetime.utcnow()
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        _remember_payment(payment_key)
+        return {"verified": False, "message": "This Payment ID has already been used"}
+    _remember_payment(payment_key)
     
     return {
         "verified": True,
@@ -422,9 +830,49 @@ async def verify_payment(request: Request, body: PaymentVerifyRequest):
 # Campaign Control Endpoints (with validation)
 # =============================================================================
 
-@app.post("/api/campaign/start")
+# DB work for async handlers runs in worker threads (sync SQLAlchemy sessions
+# would otherwise block the loop); plain `def` endpoints already run in FastAPI's threadpool
+def _reserve_messages(user_id: str, wanted: Optional[int]) -> int:
+    """
+    Reserve up to `wanted` messages (all remaining if None) from the user's quota
+    before a campaign starts. Returns the count reserved, 0 if nothing is left or
+    a concurrent start took the quota first (the guarded UPDATE matched no row).
+    """
+    db = SessionLocal()
+    try:
+        remaining = get_user_quota(db, user_id).get('messages_remaining', 0)
+        count = remaining if wanted is None else min(wanted, remaining)
+        if count > 0 and decrement_quota(db, user_id, count):
+            return count
+        return 0
+    finally:
+        db.close()
+
+def _refund_unsent_messages(user_id: str, unsent: int):
+    db = SessionLocal()
+    try:
+        refund_quota(db, user_id, unsent)
+    finally:
+        db.close()
+
+async def run_campaign(runner: CampaignRunner, excel_file: Optional[str], voters_data: Optional[List[dict]]):
+    """Run a campaign, then refund the part of its reserved quota that wasn't sent."""
+    try:
+        # The user's browser lock comes first: a campaign queued behind the same
+        # user's running one must not hold a global slot other users could run in
+        async with runner.browser_lock():
+            async with _get_campaign_semaphore():
+                if not runner.should_stop:  # Stopped while waiting for the browser or a slot
+                    await runner.execute_campaign(excel_file=excel_file, voters_data=voters_data)
+    finally:
+        finished_campaigns[runner.campaign_id] = time.monotonic()
+        if runner.user_id and runner.quota_remaining is not None:
+            unsent = runner.quota_remaining - runner.stats["sent"]
+            if unsent > 0:
+                await asyncio.to_thread(_refund_unsent_messages, runner.user_id, unsent)
+
+@app.post("/api/campaign/start", dependencies=[Depends(enforce_rate_limit)])
 async def start_campaign(
-    request: Request,
     body: CampaignStartRequest,
     background_tasks: BackgroundTasks
 ):
@@ -433,58 +881,56 @@ async def start_campaign(
     
     Security: Rate limited, input sanitized, message length limited.
     """
-    # Rate limiting
-    client_ip = request.client.host
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(status_code=429, detail="Too many requests. Please wait.")
+    # Admission control: running + waiting campaigns are capped
+    _sweep_finished_campaigns()
+    if len(active_campaigns) - len(finished_campaigns) >= MAX_CONCURRENT_CAMPAIGNS + MAX_QUEUED_CAMPAIGNS:
+        raise HTTPException(status_code=503, detail="Too many active campaigns. Please try again later.")
     
     campaign_id = str(uuid.uuid4())[:8]
     
     try:
         # Validate and sanitize voters data
         voters_data = body.voters_data or []
-        sanitized_voters = []
-        
-        for voter in voters_data[:body.max_messages]:  # Limit by plan
-            if isinstance(voter, dict):
-                sanitized_voter = {
-                    'NAME': sanitize_string(voter.get('NAME', ''), 100),
-                    'MOBILE': re.sub(r'\D', '', str(voter.get('MOBILE', '')))[:12]
-                }
-                # Only include if valid mobile
-                if validate_phone_number(sanitized_voter['MOBILE']):
-                    sanitized_voters.append(sanitized_voter)
+        if len(voters_data) > INLINE_SANITIZE_MAX:
+            # Big lists go to the parse pool so the event loop isn't blocked
+            sanitized_voters = await asyncio.get_running_loop().run_in_executor(
+                _get_parse_pool(), _sanitize_campaign_voters, voters_data, body.max_messages
+            )
+        else:
+            sanitized_voters = _sanitize_campaign_voters(voters_data, body.max_messages)  # Limit by plan
         
-        # Check user quota if user_id is provided
-        user_quota = 0
+        # Reserve the user's quota up front so concurrent starts can't spend it twice;
+        # run_campaign refunds whatever isn't sent. Sheet campaigns reserve up to
+        # max_messages, since their size is only known once the runner reads the file.
+        user_quota = None
         if body.user_id:
-            db = SessionLocal()
-            try:
-                quota_info = get_user_quota(db, body.user_id)
-                user_quota = quota_info.get('messages_remaining', 0)
-                if user_quota <= 0:
-                    raise HTTPException(status_code=403, detail="No messages remaining. Please purchase a package.")
-                # Limit voters to quota
-                if len(sanitized_voters) > user_quota:
-                    sanitized_voters = sanitized_voters[:user_quota]
-            finally:
-                db.close()
+            wanted = len(sanitized_voters) or body.max_messages
+            user_quota = await asyncio.to_thread(_reserve_messages, body.user_id, wanted)
+            if user_quota <= 0:
+                raise HTTPException(status_code=403, detail="No messages remaining. Please purchase a package.")
+            # Limit voters to quota
+            if len(sanitized_voters) > user_quota:
+                sanitized_voters = sanitized_voters[:user_quota]
         
-        runner = CampaignRunner(
-            campaign_id=campaign_id,
-            user_id=body.user_id,
-            message_template=body.message_template,
-            broadcast_callback=lambda msg: asyncio.create_task(
-                manager.broadcast(campaign_id, msg)
-            ),
-            quota_remaining=user_quota
-        )
+        try:
+            runner = CampaignRunner(
+                campaign_id=campaign_id,
+                user_id=body.user_id,
+                message_template=body.message_template,
+                broadcast_callback=lambda msg: manager.publish(campaign_id, msg),
+                quota_remaining=user_quota
+            )
+        except Exception:
+            if user_quota:
+                await asyncio.to_thread(_refund_unsent_messages, body.user_id, user_quota)
+            raise
         
         active_campaigns[campaign_id] = runner
         
         # Start campaign in background
         background_tasks.add_task(
-            runner.execute_campaign,
+            run_campaign,
+            runner,
             excel_file=body.excel_file,
             voters_data=sanitized_voters if sanitized_voters else body.voters_data
         )
@@ -497,20 +943,19 @@ async def start_campaign(
             "websocket_url": f"ws://localhost:8000/ws/campaign/{campaign_id}"
         }
         
+    except HTTPException:
+        raise  # Keep the 403 for an exhausted quota
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/campaign/{campaign_id}/stop")
 async def stop_campaign(campaign_id: str):
     """Stop a running campaign."""
-    # Validate campaign_id format
-    if not re.match(r'^[a-f0-9\-]{8}$', campaign_id):
-        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
-    
-    if campaign_id not in active_campaigns:
+    # active_campaigns is authoritative - malformed IDs are simply not found
+    runner = active_campaigns.get(campaign_id)
+    if runner is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    runner = active_campaigns[campaign_id]
     runner.stop()
     
     return {"success": True, "message": f"Campaign {campaign_id} stopped"}
@@ -518,14 +963,10 @@ async def stop_campaign(campaign_id: str):
 @app.get("/api/campaign/{campaign_id}/status")
 async def campaign_status(campaign_id: str):
     """Get current status of a campaign."""
-    # Validate campaign_id format
-    if not re.match(r'^[a-f0-9\-]{8}$', campaign_id):
-        raise HTTPException(status_code=400, detail="Invalid campaign ID format")
-    
-    if campaign_id not in active_campaigns:
+    runner = active_campaigns.get(campaign_id)
+    if runner is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    runner = active_campaigns[campaign_id]
     return runner.get_status()
 
 # =============================================================================
@@ -539,7 +980,7 @@ async def websocket_endpoint(websocket: WebSocket, campaign_id: str):
     Connect to receive live updates during campaign execution.
     """
     # Validate campaign_id format
-    if not re.match(r'^[a-f0-9\-]{8}$', campaign_id):
+    if not is_valid_campaign_id(campaign_id):
         await websocket.close(code=4000)
         return
     
@@ -547,24 +988,17 @@ async def websocket_endpoint(websocket: WebSocket, campaign_id: str):
     
     try:
         # Send initial connection message
-        await websocket.send_json({
-            "type": "connected",
-            "campaign_id": campaign_id,
-            "message": "Connected to campaign log stream"
-        })
+        await websocket.send_text(CONNECTED_FRAME_TEMPLATE % campaign_id)
         
-        # Keep connection alive and handle any incoming messages
-        while True:
-            try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=30)
-                # Handle ping/pong or commands
-                if data == "ping":
-                    await websocket.send_text("pong")
-            except asyncio.TimeoutError:
-                # Send heartbeat
-                await websocket.send_json({"type": "heartbeat"})
+        # Keepalive is protocol-level ping/pong (WS_PING_INTERVAL), so just handle
+        # incoming messages; iter_text() ends when the client disconnects
+        async for data in websocket.iter_text():
+            if data == "ping":
+                await websocket.send_text("pong")
                 
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket, campaign_id)
 
 # =============================================================================
@@ -585,23 +1019,20 @@ async def whatsapp_status():
     }
 
 @app.get("/api/whatsapp/qr")
-async def get_whatsapp_qr():
-    """Get the WhatsApp QR code screenshot for remote scanning."""
-    from fastapi.responses import FileResponse
-    
-    qr_path = os.path.join(os.path.dirname(__file__), "uploads", "qr_code.png")
-    
-    if os.path.exists(qr_path):
-        return FileResponse(
-            qr_path, 
-            media_type="image/png",
-            headers={"Cache-Control": "no-cache, no-store, must-revalidate"}
-        )
-    else:
+async def get_whatsapp_qr(request: Request, user_id: Optional[str] = None):
+    """Get the WhatsApp QR code screenshot for remote scanning (served from memory)."""
+    qr = qr_provider.get(user_id)
+    if qr is None:
         raise HTTPException(
             status_code=404, 
             detail="QR code not available. Start a campaign first to generate the QR code."
         )
+    
+    png, etag = qr
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=png, media_type="image/png", headers=headers)
 
 @app.get("/api/whatsapp/vnc-url/{user_id}")
 async def get_vnc_url(user_id: str, request: Request):
@@ -631,46 +1062,60 @@ async def get_vnc_url(user_id: str, request: Request):
         ]
     }
 
+# The frontend polls the status endpoint, so the profile session check is cached
+# briefly (found sessions longer than misses, so a fresh link shows up quickly).
+# The endpoint is sync, so cache misses hit the filesystem in the threadpool.
+SESSION_HIT_TTL = 5.0
+SESSION_MISS_TTL = 1.0
+SESSION_CACHE_MAX = 10_000
+_session_cache: Dict[str, Tuple[float, bool]] = {}  # user_id -> (expires, has_session)
+
+def _profile_has_session(user_id: str) -> bool:
+    """Check the user's Chrome profile for WhatsApp session data (blocking)."""
+    profile_path = get_user_chrome_profile(user_id)
+    return os.path.exists(os.path.join(profile_path, "Default", "IndexedDB"))
+
+def _cached_has_session(user_id: str) -> bool:
+    now = time.monotonic()
+    cached = _session_cache.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    has_session = _profile_has_session(user_id)
+    if len(_session_cache) >= SESSION_CACHE_MAX:
+        _session_cache.clear()
+    _session_cache[user_id] = (now + (SESSION_HIT_TTL if has_session else SESSION_MISS_TTL), has_session)
+    return has_session
+
 @app.get("/api/whatsapp/status/{user_id}")
-async def get_whatsapp_status(user_id: str):
+def get_whatsapp_status(user_id: str, db: Session = Depends(get_db)):
     """Check if a user has linked their WhatsApp account."""
-    db = SessionLocal()
-    try:
-        user = get_user_by_clerk_id(db, user_id)
-        
-        # Check if profile directory exists and has session data
-        profile_path = get_user_chrome_profile(user_id)
-        session_file = os.path.join(profile_path, "Default", "IndexedDB")
-        has_session = os.path.exists(session_file)
-        
-        return {
-            "success": True,
-            "user_id": user_id,
-            "whatsapp_linked": user.whatsapp_linked or has_session,
-            "whatsapp_phone": user.whatsapp_phone
-        }
-    finally:
-        db.close()
+    user = get_user_by_clerk_id(db, user_id)
+    
+    # Check if profile directory exists and has session data
+    has_session = _cached_has_session(user_id)
+    
+    return {
+        "success": True,
+        "user_id": user_id,
+        "whatsapp_linked": user.whatsapp_linked or has_session,
+        "whatsapp_phone": user.whatsapp_phone
+    }
 
 @app.post("/api/whatsapp/mark-linked/{user_id}")
-async def mark_whatsapp_linked(user_id: str, phone: Optional[str] = None):
+def mark_whatsapp_linked(user_id: str, phone: Optional[str] = None, db: Session = Depends(get_db)):
     """Mark a user's WhatsApp as linked (called after successful QR scan)."""
-    db = SessionLocal()
-    try:
-        user = get_user_by_clerk_id(db, user_id)
-        user.whatsapp_linked = True
-        if phone:
-            user.whatsapp_phone = phone
-        user.chrome_profile_path = get_user_chrome_profile(user_id)
-        db.commit()
-        
-        return {
-            "success": True,
-            "message": "WhatsApp linked successfully",
-            "user_id": user_id
-        }
-    finally:
-        db.close()
+    user = get_user_by_clerk_id(db, user_id)
+    user.whatsapp_linked = True
+    if phone:
+        user.whatsapp_phone = phone
+    user.chrome_profile_path = get_user_chrome_profile(user_id)
+    db.commit()
+    
+    return {
+        "success": True,
+        "message": "WhatsApp linked successfully",
+        "user_id": user_id
+    }
 
 # =============================================================================
 # Payment API Endpoints
@@ -691,7 +1136,7 @@ class VerifyPaymentRequest(BaseModel):
     razorpay_signature: str
 
 @app.post("/api/payment/create-order")
-async def create_payment_order(request: CreateOrderRequest):
+def create_payment_order(request: CreateOrderRequest, db: Session = Depends(get_db)):
     """Create a Razorpay order for package purchase."""
     if not razorpay_client:
         raise HTTPException(status_code=500, detail="Payment gateway not configured")
@@ -720,26 +1165,22 @@ async def create_payment_order(request: CreateOrderRequest):
         order = razorpay_client.order.create(data=order_data)
         
         # Save order to database
-        db = SessionLocal()
-        try:
-            user = get_user_by_clerk_id(db, request.user_id)
-            if request.email:
-                user.email = request.email
-            if request.name:
-                user.name = request.name
-            
-            payment = Payment(
-                user_id=user.id,
-                amount=package_info["price"],
-                package_type=request.package_type,
-                messages_purchased=package_info["messages"],
-                razorpay_order_id=order["id"],
-                status=PaymentStatus.PENDING.value
-            )
-            db.add(payment)
-            db.commit()
-        finally:
-            db.close()
+        user = get_user_by_clerk_id(db, request.user_id)
+        if request.email:
+            user.email = request.email
+        if request.name:
+            user.name = request.name
+        
+        payment = Payment(
+            user_id=user.id,
+            amount=package_info["price"],
+            package_type=request.package_type,
+            messages_purchased=package_info["messages"],
+            razorpay_order_id=order["id"],
+            status=PaymentStatus.PENDING.value
+        )
+        db.add(payment)
+        db.commit()
         
         return {
             "success": True,
@@ -756,7 +1197,7 @@ async def create_payment_order(request: CreateOrderRequest):
         raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
 
 @app.post("/api/payment/verify")
-async def verify_payment(request: VerifyPaymentRequest):
+def verify_payment(request: VerifyPaymentRequest, db: Session = Depends(get_db)):
     """Verify Razorpay payment and add quota to user."""
     if not razorpay_client:
         raise HTTPException(status_code=500, detail="Payment gateway not configured")
@@ -772,69 +1213,84 @@ async def verify_payment(request: VerifyPaymentRequest):
     except Exception:
         raise HTTPException(status_code=400, detail="Payment verification failed")
     
-    # Update database
-    db = SessionLocal()
+    # Mark the order paid and add its messages: two UPDATE ... RETURNING statements
+    # in one transaction. Only pending orders match, so a replayed verification
+    # can't add the quota twice.
     try:
-        payment = db.query(Payment).filter(Payment.razorpay_order_id == request.razorpay_order_id).first()
-        if not payment:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        payment.razorpay_payment_id = request.razorpay_payment_id
-        payment.razorpay_signature = request.razorpay_signature
-        payment.status = PaymentStatus.COMPLETED.value
-        payment.completed_at = datetime.utcnow()
-        
-        # Add quota to user
-        user = db.query(User).filter(User.id == payment.user_id).first()
-        user.messages_remaining += payment.messages_purchased
-        user.package_type = payment.package_type
-        
-        db.commit()
-        
-        return {
-            "success": True,
-            "message": f"Payment verified! Added {payment.messages_purchased} messages.",
-            "quota": {
-                "messages_remaining": user.messages_remaining,
-                "package_type": user.package_type
-            }
+        paid = db.execute(
+            update(Payment)
+            .where(
+                Payment.razorpay_order_id == request.razorpay_order_id,
+                Payment.status == PaymentStatus.PENDING.value
+            )
+            .values(
+                razorpay_payment_id=request.razorpay_payment_id,
+                razorpay_signature=request.razorpay_signature,
+                status=PaymentStatus.COMPLETED.value,
+                completed_at=datetime.utcnow()
+            )
+            .returning(Payment.user_id, Payment.messages_purchased, Payment.package_type)
+        ).first()
+    except IntegrityError:
+        # razorpay_payment_id is unique: this payment already credited another record
+        db.rollback()
+        raise HTTPException(status_code=400, detail="This Payment ID has already been used")
+    if paid is None:
+        db.rollback()
+        if db.query(Payment.id).filter(Payment.razorpay_order_id == request.razorpay_order_id).first():
+            raise HTTPException(status_code=400, detail="Payment already verified")
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    # Add quota to user
+    user = db.execute(
+        update(User)
+        .where(User.id == paid.user_id)
+        .values(
+            messages_remaining=User.messages_remaining + paid.messages_purchased,
+            package_type=paid.package_type
+        )
+        .returning(User.clerk_user_id, User.messages_remaining, User.package_type)
+    ).first()
+    if user is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    db.commit()
+    
+    return {
+        "success": True,
+        "message": f"Payment verified! Added {paid.messages_purchased} messages.",
+        "quota": {
+            "messages_remaining": user.messages_remaining,
+            "package_type": user.package_type
         }
-    finally:
-        db.close()
+    }
 
 @app.get("/api/user/quota/{user_id}")
-async def get_user_quota_endpoint(user_id: str):
+def get_user_quota_endpoint(user_id: str, db: Session = Depends(get_db)):
     """Get user's remaining message quota."""
-    db = SessionLocal()
-    try:
-        quota = get_user_quota(db, user_id)
-        return {
-            "success": True,
-            **quota
-        }
-    finally:
-        db.close()
+    quota = get_user_quota(db, user_id)
+    return {
+        "success": True,
+        **quota
+    }
 
 @app.get("/api/user/profile/{user_id}")
-async def get_user_profile(user_id: str):
+def get_user_profile(user_id: str, db: Session = Depends(get_db)):
     """Get user profile including WhatsApp status."""
-    db = SessionLocal()
-    try:
-        user = get_user_by_clerk_id(db, user_id)
-        return {
-            "success": True,
-            "user": {
-                "id": user.clerk_user_id,
-                "email": user.email,
-                "name": user.name,
-                "package_type": user.package_type,
-                "messages_remaining": user.messages_remaining,
-                "total_sent": user.total_messages_sent,
-                "whatsapp_linked": user.whatsapp_linked
-            }
+    user = get_user_by_clerk_id(db, user_id)
+    return {
+        "success": True,
+        "user": {
+            "id": user.clerk_user_id,
+            "email": user.email,
+            "name": user.name,
+            "package_type": user.package_type,
+            "messages_remaining": user.messages_remaining,
+            "total_sent": user.total_messages_sent,
+            "whatsapp_linked": user.whatsapp_linked
         }
-    finally:
-        db.close()
+    }
 
 # =============================================================================
 # Entry Point
@@ -842,9 +1298,16 @@ async def get_user_profile(user_id: str):
 
 if __name__ == "__main__":
     import uvicorn
+    import importlib.util
+    # uvloop/httptools come with uvicorn[standard] (uvloop isn't available on Windows)
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
     print("🚀 Starting VoteFlow AI Backend...")
     print("🔐 Security: Rate limiting & input validation enabled")
     print("💳 Payments: Razorpay integration active")
     print("📡 API: http://localhost:8000")
     print("📖 Docs: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        app, host="0.0.0.0", port=8000, loop=loop, http=http, ws="websockets",
+        ws_ping_interval=WS_PING_INTERVAL, ws_ping_timeout=WS_PING_TIMEOUT
+    )
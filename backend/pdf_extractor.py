@@ -7,41 +7,45 @@ Uses OCR capabilities of Gemini Vision to read handwritten text.
 
 import fitz  # PyMuPDF
 import google.generativeai as genai
-from PIL import Image
-import io
 import json
 import asyncio
 import os
-from typing import List, Dict, Any
+import re
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
+# orjson parses Gemini's JSON faster; its JSONDecodeError subclasses json's
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+from phone_utils import clean_digits
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Gemini API Configuration (try both variable names)
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
 
-class PDFExtractor:
-    def __init__(self):
-        if not GEMINI_API_KEY:
-            raise ValueError("Missing GOOGLE_API_KEY or GEMINI_API_KEY in .env file")
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    def _pdf_page_to_image(self, page, dpi: int = 200) -> Image.Image:
-        """Convert a PyMuPDF page to PIL Image"""
-        zoom = dpi / 72
-        mat = fitz.Matrix(zoom, zoom)
-        pix = page.get_pixmap(matrix=mat)
-        img_data = pix.tobytes("png")
-        img = Image.open(io.BytesIO(img_data))
-        return img
-    
-    def _extract_page_with_gemini(self, img: Image.Image, page_num: int) -> List[Dict]:
-        """
-        Use Gemini Vision to extract voter details including HANDWRITTEN mobile numbers.
-        """
-        prompt = """Analyze this voter list page and extract ALL voter entries.
+# Pages are OCR'd concurrently, paced to the Gemini per-minute quota
+GEMINI_RPM_LIMIT = int(os.getenv("GEMINI_RPM_LIMIT", "60"))
+PAGE_CONCURRENCY = max(1, int(os.getenv("PDF_PAGE_CONCURRENCY", "8")))
+JPEG_QUALITY = 85  # Page images sent to Gemini
+RENDER_WORKERS = min(4, os.cpu_count() or 1)  # Processes rasterizing pages
+NO_MOBILE_VALUES = frozenset(("N/A", "UNCLEAR"))  # Placeholders the OCR prompt asks for
+# Body of a ```/```json fenced block anywhere in the reply (prose may surround it)
+CODE_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+# Opening fence of a reply that was cut off before its closing fence
+OPEN_FENCE_RE = re.compile(r"```(?:json)?\s*")
+
+# OCR instructions, identical for every page, so they are the system instruction
+OCR_MODEL_NAME = 'gemini-2.5-flash'
+OCR_SYSTEM_INSTRUCTION = """Analyze this voter list page and extract ALL voter entries.
 
 For each voter entry, extract:
 1. NAME - The voter's name (printed text after "Name:")
@@ -65,36 +69,110 @@ IMPORTANT OCR INSTRUCTIONS:
 - Extract ALL voters visible on the page
 - Return ONLY valid JSON, no other text
 """
-        
+
+
+class RequestRateLimiter:
+    """Async token bucket: `rate` requests per second, bursts of up to `burst`."""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self._lock = None  # Created on first use, inside the running loop
+    
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _strip_code_fence(text: str) -> str:
+    """Return the JSON inside a markdown code block, or the text as-is if unfenced."""
+    if "```" not in text:
+        return text  # Plain JSON skips the regex
+    fenced = CODE_FENCE_RE.search(text)
+    if fenced:
+        return fenced.group(1)
+    # Opening fence only (reply cut off): drop it and everything before it
+    opening = OPEN_FENCE_RE.search(text)
+    return text[opening.end():]
+
+
+# PyMuPDF holds the GIL while rendering and doesn't support threads, so pages
+# rasterize in worker processes, off the event loop and in parallel
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Process pool for page rendering (started on first use, spawned like main's parse pool)."""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _render_pool
+
+
+def shutdown_render_pool():
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_page_jpeg(pdf_path: str, page_index: int, dpi: int = 200) -> bytes:
+    """
+    Rasterize one PDF page and JPEG-encode it straight from the pixmap (no PIL round-trip).
+    Runs in a render worker, which opens its own copy of the document per call.
+    """
+    zoom = dpi / 72
+    mat = fitz.Matrix(zoom, zoom)
+    with fitz.open(pdf_path) as doc:
+        # JPEG is several times smaller than PNG and plenty for OCR at 200 DPI
+        return doc[page_index].get_pixmap(matrix=mat).tobytes("jpeg", jpg_quality=JPEG_QUALITY)
+
+
+class PDFExtractor:
+    def __init__(self):
+        if not GEMINI_API_KEY:
+            raise ValueError("Missing GOOGLE_API_KEY or GEMINI_API_KEY in .env file")
+        genai.configure(api_key=GEMINI_API_KEY)
+        self.model = genai.GenerativeModel(OCR_MODEL_NAME, system_instruction=OCR_SYSTEM_INSTRUCTION)
+        # Shared by every PDF this extractor handles, so the quota holds across uploads
+        self.rate_limiter = RequestRateLimiter(GEMINI_RPM_LIMIT / 60, PAGE_CONCURRENCY)
+    
+    async def _extract_page_with_gemini(self, img_bytes: bytes, page_num: int) -> List[Dict]:
+        """
+        Use Gemini Vision to extract voter details including HANDWRITTEN mobile numbers.
+        The OCR instructions live in the system instruction; only the image is sent.
+        """
         try:
-            # Convert PIL Image to bytes
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            img_bytes = img_bytes.getvalue()
-            
-            response = self.model.generate_content([
-                prompt,
-                {"mime_type": "image/png", "data": img_bytes}
+            await self.rate_limiter.acquire()
+            response = await self.model.generate_content_async([
+                {"mime_type": "image/jpeg", "data": img_bytes}
             ])
             
             # Parse JSON from response
-            response_text = response.text.strip()
+            response_text = _strip_code_fence(response.text.strip())
             
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            response_text = response_text.strip()
-            
-            voters = json.loads(response_text)
+            voters = orjson.loads(response_text) if ORJSON_AVAILABLE else json.loads(response_text)
             
             # Validate and clean mobile numbers
             for voter in voters:
                 mobile = voter.get("MOBILE", "N/A")
-                if mobile and mobile != "N/A" and mobile != "UNCLEAR":
-                    # Clean the mobile number (remove spaces, dashes)
-                    clean_mobile = ''.join(filter(str.isdigit, str(mobile)))
+                if isinstance(mobile, int) and not isinstance(mobile, bool):
+                    mobile = str(mobile)  # Number returned unquoted
+                # Lists/dicts are unhashable (the set lookup would raise), so only strings are cleaned
+                if isinstance(mobile, str) and mobile and mobile not in NO_MOBILE_VALUES:
+                    # Clean the mobile number (remove spaces, dashes); Gemini usually
+                    # returns bare digits already, which skip the digit filter
+                    clean_mobile = mobile if mobile.isascii() and mobile.isdigit() else clean_digits(mobile)
                     if len(clean_mobile) == 10 and clean_mobile[0] in '6789':
                         voter["MOBILE"] = clean_mobile
                     elif len(clean_mobile) == 12 and clean_mobile.startswith('91'):
@@ -117,39 +195,49 @@ IMPORTANT OCR INSTRUCTIONS:
         Returns dict with voters list and metadata.
         """
         print(f"[INFO] Opening PDF: {pdf_path}")
-        doc = fitz.open(pdf_path)
-        total_pages = len(doc)
+        with fitz.open(pdf_path) as doc:
+            total_pages = len(doc)
         print(f"[INFO] Total pages: {total_pages}")
         
-        all_voters = []
         extraction_log = []
+        pages_voters: List[List[Dict]] = [[] for _ in range(total_pages)]
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)  # Bounds pages (and images) in flight
         
-        for i, page in enumerate(doc, start=1):
-            print(f"[INFO] Processing page {i}/{total_pages}...")
-            extraction_log.append(f"Processing page {i}/{total_pages}")
-            
-            # Convert PDF page to image
-            img = self._pdf_page_to_image(page, dpi=200)
-            
-            # Extract voters using Gemini
-            voters = self._extract_page_with_gemini(img, i)
-            
-            # Add page number to each record
-            for v in voters:
-                v["PAGE"] = i
-                all_voters.append(v)
-            
-            extraction_log.append(f"  -> Extracted {len(voters)} voters from page {i}")
-            print(f"  -> Extracted {len(voters)} voters from page {i}")
-            
-            # Small delay to respect API rate limits
-            if i < total_pages:
-                await asyncio.sleep(1)
+        render_pool = _get_render_pool()
+        
+        async def process_page(i: int):
+            async with semaphore:
+                print(f"[INFO] Processing page {i}/{total_pages}...")
+                extraction_log.append(f"Processing page {i}/{total_pages}")
+                img_bytes = await loop.run_in_executor(render_pool, _render_page_jpeg, pdf_path, i - 1, 200)
+                
+                # Extract voters using Gemini
+                return i, await self._extract_page_with_gemini(img_bytes, i)
+        
+        tasks = [asyncio.create_task(process_page(i)) for i in range(1, total_pages + 1)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                i, voters = await finished
+                # Add page number to each record
+                for v in voters:
+                    v["PAGE"] = i
+                pages_voters[i - 1] = voters
+                
+                extraction_log.append(f"  -> Extracted {len(voters)} voters from page {i}")
+                print(f"  -> Extracted {len(voters)} voters from page {i}")
+        finally:
+            for task in tasks:
+                task.cancel()
         
-        doc.close()
+        # Keep page order regardless of which page finished first
+        all_voters = [v for voters in pages_voters for v in voters]
         
         # Count voters with valid mobile numbers
-        with_mobile = len([v for v in all_voters if v.get("MOBILE") and v["MOBILE"] not in ["N/A", "UNCLEAR"]])
+        with_mobile = sum(
+            1 for v in all_voters
+            if isinstance(v.get("MOBILE"), str) and v["MOBILE"] and v["MOBILE"] not in NO_MOBILE_VALUES
+        )
         
         return {
             "voters": all_voters,
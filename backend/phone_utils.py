@@ -0,0 +1,44 @@
+"""
+Phone Utils - Bulk Mobile Number Normalization
+===============================================
+Cleans voter mobile numbers into WhatsApp-ready form (digits only, 91-prefixed).
+Digits are kept with a C-level bytes.translate filter, one whole string at a time.
+"""
+
+from typing import Any, List, Optional, Sequence
+
+# Every byte except ASCII 0-9, for bytes.translate(None, ...) deletion
+_NON_DIGIT_BYTES = bytes(b for b in range(256) if not 48 <= b <= 57)
+
+
+def clean_digits(text: str) -> str:
+    """Strip everything but ASCII digits (whole-string C loop via bytes.translate)."""
+    return text.encode("ascii", "ignore").translate(None, _NON_DIGIT_BYTES).decode("ascii")
+
+
+def _as_text(value: Any) -> str:
+    """Convert a raw MOBILE cell to text (numeric cells often arrive as floats)."""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        # NaN/inf are not integers, so they become empty
+        return str(int(value)) if value.is_integer() else ""
+    return str(value)
+
+
+def normalize_phones(mobiles: Sequence[Any]) -> List[Optional[str]]:
+    """
+    Normalize raw MOBILE values to 12-digit WhatsApp numbers.
+    10-digit numbers get the 91 prefix, 12-digit numbers are kept as-is,
+    and anything else (N/A, UNCLEAR, empty, wrong length) becomes None.
+    """
+    phones = []
+    for mobile in mobiles:
+        digits = clean_digits(_as_text(mobile))
+        if len(digits) == 10:
+            phones.append("91" + digits)
+        elif len(digits) == 12:
+            phones.append(digits)
+        else:
+            phones.append(None)
+    return phones
@@ -0,0 +1,72 @@
+"""
+Shared test setup: a throwaway file SQLite database (file-backed so worker
+threads get their own connections, like the real server) and the backend
+modules on sys.path.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TMP_DIR = tempfile.mkdtemp(prefix="voteflow-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["CHROME_PROFILES_BASE"] = os.path.join(_TMP_DIR, "chrome-profiles")
+os.environ["VARIANT_CACHE_DIR"] = os.path.join(_TMP_DIR, "variants")
+sys.path.insert(0, BACKEND_DIR)
+
+from database import SessionLocal, init_db  # noqa: E402
+
+init_db()
+
+CONCURRENT_REQUESTS = 8  # Below the SQLite pool limit (5 + 10 overflow), or the barrier never fills
+
+
+class _InsertBarrierSession:
+    """Session proxy that parks add() at a barrier, so every request finishes its
+    lookups before any of them inserts and commits."""
+
+    def __init__(self, session, barrier):
+        self._session = session
+        self._barrier = barrier
+
+    def add(self, obj):
+        self._barrier.wait()
+        self._session.add(obj)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+@pytest.fixture
+def run_concurrently():
+    """Call fn(db) from CONCURRENT_REQUESTS threads, each with its own session whose
+    add() waits for the others. Returns the results; re-raises a worker's error."""
+
+    def run(fn):
+        barrier = threading.Barrier(CONCURRENT_REQUESTS, timeout=10)
+        results, errors = [], []
+
+        def worker():
+            db = SessionLocal()
+            try:
+                results.append(fn(_InsertBarrierSession(db, barrier)))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(CONCURRENT_REQUESTS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    return run
@@ -0,0 +1,168 @@
+"""AI variant handling in CampaignRunner."""
+
+import asyncio
+import json
+import os
+
+import pytest
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+import campaign_runner
+from campaign_runner import CampaignRunner
+
+BASE_MESSAGE = "Hello {NAME}, please vote for us on election day!"
+
+
+class _FakeModel:
+    def __init__(self, text):
+        self.text = text
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        return self
+
+
+def _request_variants(reply: str):
+    runner = CampaignRunner("test", message_template=BASE_MESSAGE, use_ai=False)
+    runner.gemini_model = _FakeModel(reply)
+
+    async def run():
+        runner._ws_queue = asyncio.Queue()
+        return await runner._request_variants("prompt", BASE_MESSAGE, asyncio.Semaphore(1))
+
+    return asyncio.run(run())
+
+
+def test_json_array_reply_becomes_variants():
+    variants = ["Hi {NAME}, please vote for us!", "Hello {NAME}, vote for us on election day!"]
+    assert _request_variants(json.dumps(variants)) == variants
+
+
+@pytest.mark.parametrize("reply", [
+    json.dumps({"variations": ["Hi {NAME}, please vote for us!"]}),
+    json.dumps("Hello, please vote for us!"),
+])
+def test_non_array_reply_falls_back_to_base_message(reply):
+    assert _request_variants(reply) == []
+
+
+def test_cached_variants_with_non_strings_are_ignored():
+    runner = CampaignRunner("test", message_template=BASE_MESSAGE, use_ai=False)
+    key = runner._variant_cache_key(BASE_MESSAGE)
+    os.makedirs(campaign_runner.VARIANT_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(campaign_runner.VARIANT_CACHE_DIR, f"{key}.json"), "w") as f:
+        json.dump(["Hi {NAME}!", {"text": "Hello"}], f)
+
+    assert runner._load_cached_variants(BASE_MESSAGE, 1) is None
+
+
+class _FakeElement:
+    def __init__(self, title=None, on_click=None):
+        self.title = title
+        self.on_click = on_click
+
+    def get_attribute(self, name):
+        return self.title
+
+    def click(self):
+        if self.on_click:
+            self.on_click()
+
+    def send_keys(self, *keys):
+        pass
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+
+class _FakeWhatsApp:
+    """Just enough of a WebDriver for _open_chat_resident's lookups."""
+
+    def __init__(self, results, header, search_box=True, stale_click=False):
+        self.results = results
+        self.header = header
+        self.search_box = search_box
+        self.stale_click = stale_click
+        self.opened = False
+
+    def _open(self):
+        if self.stale_click:
+            raise StaleElementReferenceException("row re-rendered")
+        self.opened = True
+
+    def find_element(self, by, value):
+        if by == By.TAG_NAME:
+            return _FakeElement()
+        found = self.find_elements(by, value)
+        if not found:
+            raise NoSuchElementException(value)
+        return found[0]
+
+    def find_elements(self, by, value):
+        locator = (by, value)
+        if locator == campaign_runner.SEARCH_BOX:
+            return [_FakeElement()] if self.search_box else []
+        if locator == campaign_runner.SEARCH_RESULT_TITLES:
+            return [_FakeElement(title, on_click=self._open) for title in self.results]
+        if locator == campaign_runner.MESSAGE_BOX:
+            return [_FakeElement()] if self.opened else []
+        if locator == campaign_runner.CHAT_HEADER_TITLE:
+            return [_FakeElement(self.header)] if self.opened else []
+        return []
+
+
+def _open_chat(driver):
+    runner = CampaignRunner("test", message_template=BASE_MESSAGE, use_ai=False)
+    runner.driver = driver
+    runner._search_wait = WebDriverWait(driver, 0.2)
+    runner._chat_wait = WebDriverWait(driver, 0.3, ignored_exceptions=(StaleElementReferenceException,))
+    return runner._open_chat_resident("919876543210")
+
+
+def test_resident_chat_opens_on_exact_number():
+    assert _open_chat(_FakeWhatsApp(["+91 98765 43210"], "+91 98765 43210")) is not None
+
+
+@pytest.mark.parametrize("driver", [
+    _FakeWhatsApp(["Ramesh", "+91 98765 43219"], "+91 98765 43219"),  # No exact result
+    _FakeWhatsApp(["+91 98765 43210"], "+91 11111 11111"),  # Header of another chat
+    _FakeWhatsApp(["+91 98765 43210"], "+91 98765 43210", search_box=False),
+    _FakeWhatsApp(["+91 98765 43210"], "+91 98765 43210", stale_click=True),
+])
+def test_resident_lookup_failures_fall_back_to_url(driver):
+    assert _open_chat(driver) is None
+
+
+class _Immediate:
+    """Stands in for a WebDriverWait whose condition is already met."""
+
+    def until(self, condition):
+        return _FakeElement()
+
+
+class _UrlDriver:
+    def get(self, url):
+        pass
+
+    def execute_script(self, script, *args):
+        return 0
+
+
+def test_resident_search_turns_off_after_consecutive_misses(monkeypatch):
+    runner = CampaignRunner("test", message_template=BASE_MESSAGE, use_ai=False)
+    runner.driver = _UrlDriver()
+    runner._send_wait = runner._tick_wait = _Immediate()
+    outcomes = iter([_FakeElement()] + [None] * campaign_runner.RESIDENT_MISS_LIMIT)
+    monkeypatch.setattr(runner, "_open_chat_resident", lambda phone: next(outcomes))
+
+    runner._resident_send = True
+    for _ in range(campaign_runner.RESIDENT_MISS_LIMIT):
+        runner._send_message_sync("919876543210", "Hi", "Hi")
+    assert runner._resident_send  # One hit, then misses just below the limit
+
+    runner._send_message_sync("919876543210", "Hi", "Hi")
+    assert not runner._resident_send
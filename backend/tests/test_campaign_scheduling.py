@@ -0,0 +1,33 @@
+"""Campaign slots and per-user browser locks."""
+
+import asyncio
+
+import main
+from campaign_runner import CampaignRunner
+
+
+def test_queued_campaigns_of_one_user_dont_hold_global_slots(monkeypatch):
+    running = []
+    release = None
+
+    async def fake_execute(self, excel_file=None, voters_data=None):
+        running.append(self.campaign_id)
+        await release.wait()
+
+    monkeypatch.setattr(CampaignRunner, "execute_campaign", fake_execute)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        monkeypatch.setattr(main, "_campaign_semaphore", asyncio.Semaphore(2))
+        runners = [CampaignRunner(f"a{i}", user_id="user_sched_a", use_ai=False) for i in range(3)]
+        runners.append(CampaignRunner("b0", user_id="user_sched_b", use_ai=False))
+        tasks = [asyncio.create_task(main.run_campaign(r, None, [])) for r in runners]
+        await asyncio.sleep(0.05)
+        started = list(running)
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    started = asyncio.run(scenario())
+    assert started == ["a0", "b0"]  # a1/a2 wait for user A's browser, not for a slot
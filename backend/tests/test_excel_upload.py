@@ -0,0 +1,36 @@
+"""Phone validation when parsing uploaded voter sheets."""
+
+from io import BytesIO
+
+import openpyxl
+
+import main
+
+
+def _sheet_bytes(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Name", "Mobile"])
+    for row in rows:
+        ws.append(row)
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def test_phone_acceptance_rules():
+    voters = main._parse_excel_bytes(_sheet_bytes([
+        ["Asha", "98765 43210"],      # 10 digits starting 6-9
+        ["Bala", 9876543210],         # Numeric cell
+        ["Chitra", "+91 98765 43210"],
+        ["Dev", "915123456789"],      # Any 12-digit 91-prefixed number is kept
+        ["Esha", "5123456789"],       # 10 digits must start 6-9
+        ["Farah", "N/A"],
+    ]))
+
+    assert [(v["NAME"], v["MOBILE"]) for v in voters] == [
+        ("Asha", "9876543210"),
+        ("Bala", "9876543210"),
+        ("Chitra", "9876543210"),
+        ("Dev", "5123456789"),
+    ]
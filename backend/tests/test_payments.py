@@ -0,0 +1,74 @@
+"""Replay protection for /api/verify-payment under concurrent requests."""
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from database import Payment, PaymentStatus, SessionLocal, User, get_user_by_clerk_id
+
+# main.verify_payment is the Razorpay route further down; resolve this one by path
+verify_payment = next(
+    route.endpoint for route in main.app.routes if getattr(route, "path", None) == "/api/verify-payment"
+)
+
+
+def test_concurrent_verifications_credit_once(run_concurrently):
+    payment_id = "pay_CONCURRENT0001"
+    body = main.PaymentVerifyRequest(payment_id=payment_id, plan_id="starter", amount=999)
+    results = run_concurrently(lambda db: verify_payment(body, db))
+
+    assert sum(r["verified"] for r in results) == 1
+    assert all(
+        r["message"] == "This Payment ID has already been used"
+        for r in results if not r["verified"]
+    )
+
+    db = SessionLocal()
+    try:
+        assert db.query(Payment).filter(Payment.razorpay_payment_id == payment_id).count() == 1
+    finally:
+        db.close()
+
+
+def test_reused_payment_id_rejected():
+    body = main.PaymentVerifyRequest(payment_id="pay_SEQUENTIAL0001", plan_id="starter", amount=999)
+    db = SessionLocal()
+    try:
+        assert verify_payment(body, db)["verified"] is True
+        assert verify_payment(body, db)["verified"] is False
+    finally:
+        db.close()
+
+
+class _AcceptAllSignatures:
+    class utility:
+        @staticmethod
+        def verify_payment_signature(params):
+            pass
+
+
+def test_razorpay_verify_rejects_payment_id_used_elsewhere(monkeypatch):
+    payment_id = "pay_CROSSENDPOINT01"
+    body = main.PaymentVerifyRequest(payment_id=payment_id, plan_id="starter", amount=999)
+    db = SessionLocal()
+    try:
+        assert verify_payment(body, db)["verified"] is True
+
+        user = get_user_by_clerk_id(db, "user_razorpay_reuse")
+        db.add(Payment(
+            user_id=user.id, amount=999, package_type="starter", messages_purchased=100,
+            razorpay_order_id="order_CROSSENDPOINT01", status=PaymentStatus.PENDING.value
+        ))
+        db.commit()
+
+        monkeypatch.setattr(main, "razorpay_client", _AcceptAllSignatures)
+        request = main.VerifyPaymentRequest(
+            user_id="user_razorpay_reuse", razorpay_order_id="order_CROSSENDPOINT01",
+            razorpay_payment_id=payment_id, razorpay_signature="sig"
+        )
+        with pytest.raises(HTTPException) as excinfo:
+            main.verify_payment(request, db)
+        assert excinfo.value.status_code == 400
+        assert db.query(User).filter(User.clerk_user_id == "user_razorpay_reuse").one().messages_remaining == 0
+    finally:
+        db.close()
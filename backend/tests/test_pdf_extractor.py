@@ -0,0 +1,82 @@
+"""Parsing of Gemini OCR replies."""
+
+import asyncio
+import json
+
+import fitz
+
+import pdf_extractor
+from pdf_extractor import PDFExtractor, RequestRateLimiter, _strip_code_fence
+
+VOTERS = [{"NAME": "Asha", "MOBILE": "9876543210"}]
+BODY = json.dumps(VOTERS)
+
+
+def test_plain_json_is_unchanged():
+    assert _strip_code_fence(BODY) == BODY
+
+
+def test_fenced_json():
+    assert json.loads(_strip_code_fence(f"```json\n{BODY}\n```")) == VOTERS
+
+
+def test_fenced_json_with_surrounding_prose():
+    reply = f"Here are the voters:\n```json\n{BODY}\n```\nLet me know if you need anything else."
+    assert json.loads(_strip_code_fence(reply)) == VOTERS
+
+
+def test_unclosed_fence():
+    assert json.loads(_strip_code_fence(f"```json\n{BODY}\n")) == VOTERS
+
+
+class _FakeModel:
+    def __init__(self, text):
+        self.text = text
+
+    async def generate_content_async(self, parts):
+        return self
+
+
+def _extract_page(reply: str):
+    extractor = PDFExtractor.__new__(PDFExtractor)  # Skips the API key check
+    extractor.model = _FakeModel(reply)
+    extractor.rate_limiter = RequestRateLimiter(100, 10)
+    return asyncio.run(extractor._extract_page_with_gemini(b"", 1))
+
+
+def test_mobile_values_of_any_json_type():
+    voters = _extract_page(json.dumps([
+        {"NAME": "Asha", "MOBILE": "98765-43210"},
+        {"NAME": "Bala", "MOBILE": 919876543210},
+        {"NAME": "Chitra", "MOBILE": ["9876543210", "9123456780"]},
+        {"NAME": "Dev", "MOBILE": {"number": "9876543210"}},
+        {"NAME": "Esha", "MOBILE": "N/A"},
+    ]))
+
+    assert [v["MOBILE"] for v in voters] == [
+        "9876543210",
+        "9876543210",
+        ["9876543210", "9123456780"],
+        {"number": "9876543210"},
+        "N/A",
+    ]
+
+
+def test_extract_voters_renders_every_page_in_order(tmp_path):
+    pdf_path = str(tmp_path / "voters.pdf")
+    with fitz.open() as doc:
+        for i in range(3):
+            doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+        doc.save(pdf_path)
+
+    extractor = PDFExtractor.__new__(PDFExtractor)
+    extractor.model = _FakeModel(json.dumps([{"NAME": "Asha", "MOBILE": "9876543210"}]))
+    extractor.rate_limiter = RequestRateLimiter(100, 10)
+    try:
+        result = asyncio.run(extractor.extract_voters(pdf_path))
+    finally:
+        pdf_extractor.shutdown_render_pool()
+        pdf_extractor._render_pool = None
+
+    assert result["pages_processed"] == 3
+    assert [v["PAGE"] for v in result["voters"]] == [1, 2, 3]
@@ -0,0 +1,92 @@
+"""Quota is reserved when a campaign starts and the unsent part refunded afterwards."""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from database import SessionLocal, User, get_user_by_clerk_id
+
+client = TestClient(main.app)
+
+
+def _voters(n):
+    return [{"NAME": f"Voter {i}", "MOBILE": f"98765{i:05d}"} for i in range(n)]
+
+
+def _set_quota(clerk_user_id: str, messages: int):
+    db = SessionLocal()
+    try:
+        get_user_by_clerk_id(db, clerk_user_id).messages_remaining = messages
+        db.commit()
+    finally:
+        db.close()
+
+
+def _quota(clerk_user_id: str) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(User).filter(User.clerk_user_id == clerk_user_id).one().messages_remaining
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def sends(monkeypatch):
+    """Replace the browser run with one that 'sends' the given number of messages."""
+    state = {"count": 0}
+
+    async def fake_execute(self, excel_file=None, voters_data=None):
+        self.stats["sent"] = min(state["count"], self.quota_remaining)
+
+    monkeypatch.setattr(main.CampaignRunner, "execute_campaign", fake_execute)
+    return state
+
+
+def _start(clerk_user_id: str, voters: int):
+    return client.post("/api/campaign/start", json={
+        "user_id": clerk_user_id, "message_template": "Hi {NAME}", "voters_data": _voters(voters)
+    })
+
+
+def test_exhausted_quota_is_rejected(sends):
+    _set_quota("user_quota_full_spend", 3)
+    sends["count"] = 3
+    assert _start("user_quota_full_spend", 3).status_code == 200
+    assert _quota("user_quota_full_spend") == 0
+
+    assert _start("user_quota_full_spend", 3).status_code == 403
+
+
+def test_campaign_is_capped_and_unsent_messages_refunded(sends):
+    _set_quota("user_quota_refund", 5)
+    sends["count"] = 2
+    response = _start("user_quota_refund", 8)
+
+    assert response.status_code == 200
+    assert response.json()["voters_count"] == 5  # Capped at the quota
+    assert _quota("user_quota_refund") == 3
+
+
+def test_reservation_is_guarded():
+    _set_quota("user_quota_guarded", 4)
+    assert main._reserve_messages("user_quota_guarded", 4) == 4
+    assert main._reserve_messages("user_quota_guarded", 4) == 0
+    assert _quota("user_quota_guarded") == 0
+
+
+def test_concurrent_reservations_never_overspend():
+    _set_quota("user_quota_concurrent", 4)
+    reserved = []
+    threads = [
+        threading.Thread(target=lambda: reserved.append(main._reserve_messages("user_quota_concurrent", 4)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(reserved) == 4
+    assert _quota("user_quota_concurrent") == 0
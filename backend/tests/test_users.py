@@ -0,0 +1,16 @@
+"""Get-or-create of users when a new user's first requests arrive together."""
+
+from database import SessionLocal, User, get_user_by_clerk_id
+
+
+def test_concurrent_first_requests_create_one_user(run_concurrently):
+    clerk_user_id = "user_concurrent_first_load"
+    ids = run_concurrently(lambda db: get_user_by_clerk_id(db, clerk_user_id).id)
+
+    assert len(set(ids)) == 1
+
+    db = SessionLocal()
+    try:
+        assert db.query(User).filter(User.clerk_user_id == clerk_user_id).count() == 1
+    finally:
+        db.close()
@@ -56,13 +56,14 @@ function Dashboard() {
         }
     }
 
-    const addLog = useCallback((message, type = 'info') => {
+    const addLog = useCallback((message, type = 'info', ts = null) => {
         // Filter out stacktrace/hex address spam
         if (message.includes('<unknown>') || message.includes('0x') || message.includes('Stacktrace')) {
             return // Skip noisy logs
         }
-        const timestamp = new Date().toLocaleTimeString('en-US', { hour12: false })
-        setLogs(prev => [...prev.slice(-50), { id: Date.now(), timestamp, message, type }])
+        // Server events carry an epoch-seconds `ts`; local messages use the current time
+        const timestamp = (ts ? new Date(ts * 1000) : new Date()).toLocaleTimeString('en-US', { hour12: false })
+        setLogs(prev => [...prev.slice(-50), { id: `${Date.now()}-${Math.random()}`, timestamp, message, type }])
     }, [])
 
     // Connect to WebSocket for campaign updates
@@ -76,11 +77,15 @@ function Dashboard() {
             addLog('WebSocket connected - receiving live updates', 'success')
         }
 
-        ws.onmessage = (event) => {
-            const data = JSON.parse(event.data)
-
-            if (data.type === 'log') {
-                addLog(data.message, data.log_type)
+        const handleEvent = (data) => {
+            if (data.type === 'batch') {
+                data.events.forEach(handleEvent)
+            } else if (data.t === 'p') {
+                // Compact per-voter progress event
+                const sent = data.s === 'sent'
+                addLog(`${sent ? '✅ Sent to' : '❌ Failed:'} [${data.i}] ${data.n} (${data.p})`, sent ? 'success' : 'error', data.ts)
+            } else if (data.type === 'log') {
+                addLog(data.message, data.log_type, data.ts)
                 if (data.stats) setStats(data.stats)
             } else if (data.type === 'stats') {
                 setStats(data.stats)
@@ -103,6 +108,10 @@ function Dashboard() {
             }
         }
 
+        ws.onmessage = (event) => {
+            handleEvent(JSON.parse(event.data))
+        }
+
         ws.onclose = () => {
             setConnected(false)
             addLog('WebSocket disconnected', 'warning')